@@ -0,0 +1,99 @@
+#!python
+"""Compare per-line parsing with FieldExtractor on haproxy log data.
+
+The sample log in data/haproxy.log is repeated until it reaches the
+requested size. Both variants compute the same request count, error count
+and t_tot percentiles; only the way fields are extracted differs.
+
+Usage::
+
+    python benchmark/haproxy_log.py [--scale N] [--repeat N] [--no-numpy]
+"""
+
+import argparse
+import os
+import re
+import time
+
+import nagiosplugin
+
+SAMPLE = os.path.join(os.path.dirname(__file__), '..', 'data', 'haproxy.log')
+PATTERN = (rb'haproxy.*: [0-9.:]+ \[\S+\] .* '
+           rb'\d+/\d+/\d+/\d+/(?P<ttot>\d+) (?P<status>\d\d\d) ')
+BLOCKSIZE = 1 << 20
+
+
+def blocks(data):
+    """Splits data at line boundaries like LogTail's chunk mode."""
+    start = 0
+    while start < len(data):
+        end = data.rfind(b'\n', start, start + BLOCKSIZE) + 1
+        if end <= start:
+            end = len(data)
+        yield memoryview(data)[start:end]
+        start = end
+
+
+def per_line(data):
+    r_logline = re.compile(PATTERN)
+    ttot = nagiosplugin.Histogram()
+    errors = 0
+    for line in data.splitlines():
+        match = r_logline.search(line)
+        if not match:
+            continue
+        t, stat = match.groups()
+        ttot.add(int(t))
+        errors += not (stat.startswith(b'2') or stat.startswith(b'3'))
+    return len(ttot), errors, ttot.percentiles([50, 95])
+
+
+def vectorized(data, use_numpy=None):
+    extractor = nagiosplugin.FieldExtractor(
+        PATTERN, use_numpy=use_numpy, ttot=int, status=int)
+    ttot = nagiosplugin.Histogram()
+    errors = 0
+    for block in blocks(data):
+        columns = extractor.extract(block)
+        ttot.update(columns['ttot'])
+        status = columns['status']
+        errors += len(status) - extractor.count(status, 200, 400)
+    return len(ttot), errors, ttot.percentiles([50, 95])
+
+
+def measure(func, repeat, *args):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    argp = argparse.ArgumentParser()
+    argp.add_argument('--scale', type=int, default=200,
+                      help='repeat sample log N times (default: %(default)s)')
+    argp.add_argument('--repeat', type=int, default=3,
+                      help='report best of N runs (default: %(default)s)')
+    argp.add_argument('--no-numpy', action='store_true',
+                      help='use the array.array fallback')
+    args = argp.parse_args()
+    with open(SAMPLE, 'rb') as f:
+        data = f.read() * args.scale
+    print('{0} MiB, {1} lines'.format(
+        len(data) >> 20, data.count(b'\n')))
+    baseline, expected = measure(per_line, args.repeat, data)
+    print('per line:        {0:7.3f}s'.format(baseline))
+    elapsed, result = measure(vectorized, args.repeat, data,
+                              False if args.no_numpy else None)
+    print('FieldExtractor:  {0:7.3f}s  ({1:.1f}x)'.format(
+        elapsed, baseline / elapsed))
+    if result != expected:
+        raise SystemExit('results differ: {0} != {1}'.format(
+            result, expected))
+
+
+if __name__ == '__main__':
+    main()
@@ -24,9 +24,11 @@ setup(
         'License :: OSI Approved :: Zope Public License',
         'Operating System :: Microsoft :: Windows',
         'Operating System :: POSIX',
-        'Programming Language :: Python :: 3.2',
-        'Programming Language :: Python :: 3.3',
-        'Programming Language :: Python :: 3.4',
+        'Programming Language :: Python :: 3.7',
+        'Programming Language :: Python :: 3.8',
+        'Programming Language :: Python :: 3.9',
+        'Programming Language :: Python :: 3.10',
+        'Programming Language :: Python :: 3.11',
         'Topic :: Software Development :: Libraries :: Python Modules',
         'Topic :: System :: Monitoring',
     ],
@@ -37,9 +39,16 @@ setup(
     download_url='http://pypi.python.org/pypi/nagiosplugin',
     license='ZPL-2.1',
     packages=find_packages('src'),
+    py_modules=['nagiosplugin_client'],
     package_dir={'': 'src'},
     include_package_data=True,
     zip_safe=False,
     test_suite='nagiosplugin.tests',
     extras_require={'test': ['setuptools', 'pytest']},
+    entry_points={
+        'console_scripts': [
+            'nagiosplugin-batch = nagiosplugin.batch:main',
+            'nagiosplugin-call = nagiosplugin_client:main',
+        ],
+    },
 )
@@ -1,8 +1,10 @@
 from .check import Check
-from .context import Context, ScalarContext
-from .cookie import Cookie
+from .context import Context, ScalarContext, RateContext
+from .cookie import Cookie, SQLiteCookie
 from .error import CheckError, Timeout
-from .logtail import LogTail
+from .fields import FieldExtractor
+from .histogram import Histogram
+from .logtail import LogTail, MMapLogTail, MultiLogTail
 from .metric import Metric
 from .multiarg import MultiArg
 from .performance import Performance
@@ -0,0 +1,187 @@
+"""Run many checks within a single process.
+
+Forking a new interpreter for each check is expensive if there are
+hundreds of small checks per host. The batch runner executes a list of
+check definitions in one interpreter, optionally in parallel, and emits
+one JSON record per check as soon as the check is finished.
+
+A check definition names a factory (a callable given as
+"module:callable" string) together with its arguments. The factory must
+return a fully populated :class:`~.check.Check` object. Definitions can
+be read from a text file with one definition per line::
+
+    # name    factory                                   arguments
+    load      mychecks:load_check                       --warning 4
+    disk_var  mychecks:disk_check                       /var 90%
+
+Invoke the runner from the command line with::
+
+    nagiosplugin-batch -j 8 checks.conf
+
+Each output line is a JSON object with the keys `name`, `status`
+(status line without performance data), `perfdata` (list of performance
+data items), `output` (complete plugin output), and `exitcode`.
+
+Alternatively, results can be submitted as passive check results (see
+:mod:`~nagiosplugin.passive`) with the check names as service
+descriptions. All results of a batch are submitted at once::
+
+    nagiosplugin-batch -H web01 -c /var/lib/nagios/rw/nagios.cmd checks.conf
+"""
+
+from .check import Check
+from .error import Timeout
+from .passive import CommandFile, SpoolDirectory
+from .runtime import Runtime
+from .server import resolve
+import argparse
+import concurrent.futures
+import contextvars
+import json
+import shlex
+import sys
+
+
+class Definition(object):
+    """Recipe to create a check."""
+
+    def __init__(self, name, factory, args=()):
+        """Creates check definition.
+
+        :param name: identifies the check in the result record
+        :param factory: callable or "module:callable" string which
+            returns a :class:`~.check.Check` object
+        :param args: positional arguments to the factory
+        """
+        self.name = name
+        self.factory = factory
+        self.args = list(args)
+
+    @classmethod
+    def parse(cls, line):
+        """Creates definition from a "name factory args..." line.
+
+        Arguments are split according to shell quoting rules.
+        """
+        name, factory, *args = shlex.split(line)
+        return cls(name, factory, args)
+
+    def create(self):
+        check = resolve(self.factory)(*self.args)
+        if not isinstance(check, Check):
+            raise TypeError('factory did not return a Check object',
+                            self.factory, check)
+        return check
+
+
+def parse_definitions(lines):
+    """Yields definitions from `lines`, skipping blanks and comments."""
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            yield Definition.parse(line)
+
+
+def execute(definition, verbose=None, timeout=None):
+    """Runs check from `definition` in a runtime of its own.
+
+    Exceptions are caught and reported like :func:`~.runtime.guarded`
+    does.
+
+    :returns: result record (dict)
+    """
+    return contextvars.Context().run(_execute, definition, verbose, timeout)
+
+
+def _execute(definition, verbose, timeout):
+    runtime = Runtime()
+    check = None
+    try:
+        check = definition.create()
+        output, exitcode = check.run(verbose, timeout)
+    except Timeout as exc:
+        runtime.check = check
+        runtime._report_exception(
+            'Timeout: check execution aborted after {0}'.format(exc))
+        output, exitcode = str(runtime.output), runtime.exitcode
+    except Exception:
+        runtime.check = check
+        runtime._report_exception()
+        output, exitcode = str(runtime.output), runtime.exitcode
+    return dict(
+        name=definition.name,
+        status=output.split('\n', 1)[0].split('|', 1)[0].strip(),
+        perfdata=list(check.perfdata) if check else [],
+        output=output,
+        exitcode=exitcode)
+
+
+def run_batch(definitions, max_workers=None, verbose=None, timeout=None):
+    """Executes all checks in `definitions`.
+
+    :param definitions: iterable of :class:`Definition` objects
+    :param max_workers: run so many checks in parallel (using threads)
+    :param verbose: override verbosity of all checks
+    :param timeout: override timeout of all checks
+    :yields: result records in order of completion
+    """
+    if (max_workers or 0) <= 1:
+        for definition in definitions:
+            yield execute(definition, verbose, timeout)
+        return
+    with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+        futures = [executor.submit(execute, definition, verbose, timeout)
+                   for definition in definitions]
+        for future in concurrent.futures.as_completed(futures):
+            yield future.result()
+
+
+def parse_args(argv=None):
+    argp = argparse.ArgumentParser(
+        description='Run many Nagios/Icinga checks in a single process.')
+    argp.add_argument('definitions', type=argparse.FileType('r'),
+                      help='file with one check definition per line '
+                      '("-" for stdin)')
+    argp.add_argument('-j', '--jobs', type=int, default=1,
+                      help='run JOBS checks in parallel '
+                      '(default: %(default)s)')
+    argp.add_argument('-t', '--timeout', type=float, default=None,
+                      help='abort each check after TIMEOUT seconds')
+    argp.add_argument('-v', '--verbose', action='count', default=None,
+                      help='increase output verbosity (use up to 3 times)')
+    argp.add_argument('-H', '--host', default=None,
+                      help='host name for passive check results')
+    sink = argp.add_mutually_exclusive_group()
+    sink.add_argument('-c', '--command-file', default=None,
+                      help='submit passive check results to COMMAND_FILE '
+                      'instead of printing JSON records')
+    sink.add_argument('-s', '--spool-dir', default=None,
+                      help='submit passive check results as file in '
+                      'SPOOL_DIR instead of printing JSON records')
+    args = argp.parse_args(argv)
+    if (args.command_file or args.spool_dir) and not args.host:
+        argp.error('passive check results require --host')
+    return args
+
+
+def main(argv=None):  # pragma: no cover
+    args = parse_args(argv)
+    with args.definitions as f:
+        definitions = list(parse_definitions(f))
+    records = run_batch(definitions, args.jobs, args.verbose, args.timeout)
+    if args.command_file or args.spool_dir:
+        sink = (CommandFile(args.command_file, args.host)
+                if args.command_file else
+                SpoolDirectory(args.spool_dir, args.host))
+        with sink:
+            for record in records:
+                sink.add(record['name'], record['exitcode'],
+                         record['output'])
+        return
+    for record in records:
+        sys.stdout.write(json.dumps(record) + '\n')
+        sys.stdout.flush()
+
+
+if __name__ == '__main__':  # pragma: no cover
+    main()
@@ -2,19 +2,253 @@
 
 from .context import Context, Contexts
 from .error import CheckError
+from .error import Timeout
 from .metric import Metric
+from .platform import cancelled
 from .resource import Resource
 from .result import Result, Results
 from .runtime import Runtime
 from .state import Ok, Unknown
 from .summary import Summary
+import concurrent.futures
+import contextvars
+import functools
+import inspect
 import logging
 import numbers
+import queue
 import sys
+import threading
+import time
 
 _log = logging.getLogger(__name__)
 
 
+def _probe(resource):
+    """Runs `resource.probe()` to completion.
+
+    Used to acquire metrics on a worker pool. The metrics are buffered
+    together with a :exc:`CheckError` that possibly aborted probing, so
+    that evaluation can take place later in the controlling thread.
+    """
+    probed = _Probed()
+    try:
+        metrics = resource.probe()
+        probed.produced = bool(metrics)
+        if isinstance(metrics, Metric):
+            metrics = [metrics]
+        for metric in metrics or []:
+            probed.metrics.append(metric)
+    except CheckError as e:
+        probed.error = e
+    return probed
+
+
+def _probe_detached(resource):
+    """Runs :func:`_probe` in a worker process.
+
+    References to the resource and context objects are removed from the
+    metrics before they are sent back to the parent process. The parent
+    binds metrics to its own objects during evaluation.
+    """
+    probed = _probe(resource)
+    probed.metrics = [metric.replace(resource=None, contextobj=None)
+                      for metric in probed.metrics]
+    return probed
+
+
+async def _probe_async(resource):
+    """Awaits a coroutine or async generator `resource.probe()`.
+
+    Coroutines may return the same kinds of values as synchronous
+    probes. Async generators emit :class:`Metric` objects.
+    """
+    probed = _Probed()
+    try:
+        metrics = resource.probe()
+        if inspect.isawaitable(metrics):
+            metrics = await metrics
+            probed.produced = bool(metrics)
+        if isinstance(metrics, Metric):
+            metrics = [metrics]
+        if hasattr(metrics, '__aiter__'):
+            async for metric in metrics:
+                probed.metrics.append(metric)
+        else:
+            for metric in metrics or []:
+                probed.metrics.append(metric)
+    except CheckError as e:
+        probed.error = e
+    return probed
+
+
+def _is_async(resource):
+    return (inspect.iscoroutinefunction(resource.probe) or
+            inspect.isasyncgenfunction(resource.probe))
+
+
+class _Probed(object):
+    """Replays buffered metrics and the error that terminated probing."""
+
+    def __init__(self):
+        self.metrics = []
+        self.produced = True
+        self.error = None
+
+    def __bool__(self):
+        return self.produced
+
+    def __iter__(self):
+        for metric in self.metrics:
+            yield metric
+        if self.error:
+            raise self.error
+
+
+def _overrun(resource, budget):
+    """Stands in for probe results of a resource that ran out of time."""
+    probed = _Probed()
+    probed.error = CheckError('{0}: timeout after {1}s'.format(
+        resource.name, budget))
+    return probed
+
+
+class _DaemonThreadPool(concurrent.futures.Executor):
+    """Thread pool whose workers do not keep the interpreter alive.
+
+    :class:`concurrent.futures.ThreadPoolExecutor` joins its workers
+    when the interpreter exits, so a hung probe would keep a plugin
+    from terminating even after it has reported a timeout. The workers
+    of this pool are daemon threads which are simply dropped at exit.
+    """
+
+    def __init__(self, max_workers):
+        self.max_workers = max_workers
+        self.work = queue.SimpleQueue()
+        self.threads = []
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def submit(self, fn, *args, **kwargs):
+        with self.lock:
+            if self.closed:
+                raise RuntimeError('cannot schedule new futures after '
+                                   'shutdown')
+            future = concurrent.futures.Future()
+            self.work.put((future, fn, args, kwargs))
+            if len(self.threads) < self.max_workers:
+                thread = threading.Thread(target=self._worker, daemon=True)
+                thread.start()
+                self.threads.append(thread)
+        return future
+
+    def _worker(self):
+        while True:
+            item = self.work.get()
+            if item is None:
+                return
+            future, fn, args, kwargs = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        with self.lock:
+            self.closed = True
+            if cancel_futures:
+                while True:
+                    try:
+                        item = self.work.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is not None:
+                        item[0].cancel()
+            for _ in self.threads:
+                self.work.put(None)
+        if wait:
+            for thread in self.threads:
+                thread.join()
+
+
+def _abandon(executor, futures):
+    """Shuts `executor` down without waiting for running probes.
+
+    Pending probes are cancelled. Worker processes are terminated since
+    they would otherwise be waited for when the interpreter exits.
+    """
+    for future in futures:
+        future.cancel()
+    if isinstance(executor, _DaemonThreadPool):
+        executor.shutdown(wait=False, cancel_futures=True)
+        return
+    processes = list((getattr(executor, '_processes', None) or {}).values())
+    executor.shutdown(wait=False)
+    for process in processes:
+        process.terminate()
+
+
+class _DeadlineTask(threading.Thread):
+    """Probes a single resource within its own time budget.
+
+    The budget starts when the task acquires one of the worker `slots`.
+    A task that overruns is abandoned: it gives its slot back so that
+    the remaining resources can proceed, and its thread is left to
+    finish in the background.
+    """
+
+    def __init__(self, resource, slots):
+        super(_DeadlineTask, self).__init__(daemon=True)
+        self.context = contextvars.copy_context()
+        self.resource = resource
+        self.slots = slots
+        self.started = threading.Event()
+        self.finished = threading.Event()
+        self.start_time = None
+        self.probed = None
+        self.exception = None
+        self.abandoned = False
+        self.lock = threading.Lock()
+
+    def run(self):
+        self.slots.acquire()
+        self.start_time = time.monotonic()
+        self.started.set()
+        try:
+            self.probed = self.context.run(_probe, self.resource)
+        except BaseException as e:
+            # re-raised in the controlling thread by join_until_deadline
+            self.exception = e
+        finally:
+            self.finished.set()
+            with self.lock:
+                if not self.abandoned:
+                    self.slots.release()
+
+    def join_until_deadline(self, budget):
+        """Waits for the probe to finish within `budget` seconds.
+
+        :returns: probe results or :obj:`None` if the budget is exceeded
+        :raises: the exception that terminated the probe, unless it was
+            a :exc:`CheckError`
+        """
+        self.started.wait()
+        remaining = self.start_time + budget - time.monotonic()
+        if not self.finished.wait(max(remaining, 0)):
+            with self.lock:
+                self.abandoned = not self.finished.is_set()
+                if self.abandoned:
+                    self.slots.release()
+                    return None
+        if self.exception is not None:
+            raise self.exception
+        return self.probed
+
+
 class Check(object):
     """Orchestrates the the various stages of check execution.
 
@@ -28,14 +262,40 @@ class Check(object):
     name = ''
     verbose = 1
     timeout = 10
+    max_workers = None
+    executor = 'thread'
+    resource_timeout = None
+    timeout_method = 'auto'
 
-    def __init__(self, *objects):
+    def __init__(self, *objects, max_workers=None, executor=None,
+                 resource_timeout=None, timeout_method=None):
         """Initializes a :class:`Check` right away with `objects`. See
         :meth:`add` for a list of allowed object types.
 
         Alternatively, objects can be added later using the :meth:`add`
         method.
+
+        :param max_workers: probe resources concurrently on a pool of
+            so many workers (see :attr:`max_workers`)
+        :param executor: either "thread" or "process" to select the
+            kind of worker pool (see :attr:`executor`)
+        :param resource_timeout: time budget in seconds for each
+            resource (see :attr:`resource_timeout`)
+        :param timeout_method: either "auto" or "thread" (see
+            :attr:`timeout_method`)
+
+        .. versionchanged:: 2.0
+           Added `max_workers`, `executor`, `resource_timeout`, and
+           `timeout_method` parameters.
         """
+        if max_workers is not None:
+            self.max_workers = max_workers
+        if executor is not None:
+            self.executor = executor
+        if resource_timeout is not None:
+            self.resource_timeout = resource_timeout
+        if timeout_method is not None:
+            self.timeout_method = timeout_method
         self.resources = []
         self.contexts = Contexts()
         self.summary = Summary()
@@ -69,10 +329,13 @@ class Check(object):
                     type(obj)), obj)
         return self
 
-    def _evaluate_resource(self, resource):
+    def _evaluate_resource(self, resource, metrics=None):
+        if cancelled():
+            raise Timeout('check has been abandoned')
         try:
             metric = None
-            metrics = resource.probe()
+            if metrics is None:
+                metrics = resource.probe()
             if not metrics:
                 _log.warning('resource %s did not produce any metric',
                              resource.name)
@@ -94,10 +357,162 @@ class Check(object):
         which delegates check execution to the :class:`Runtime`
         environment.
         """
-        for resource in self.resources:
-            self._evaluate_resource(resource)
+        try:
+            if self.is_async:
+                # imported on demand to keep start-up of synchronous
+                # plugins fast
+                import asyncio
+                self._evaluate_all(asyncio.run(self._probe_all_async()))
+            elif self.resource_timeout:
+                self._evaluate_with_deadlines()
+            elif (self.max_workers or 0) > 1 and len(self.resources) > 1:
+                self._evaluate_concurrently()
+            else:
+                for resource in self.resources:
+                    self._evaluate_resource(resource)
+        finally:
+            self.contexts.close()
+        self._compact_perfdata()
+
+    async def acall(self):
+        """Asynchronous variant of :meth:`__call__`.
+
+        Probes all resources concurrently on the running event loop.
+        Don't call this method directly, but use :meth:`arun`.
+
+        .. versionadded:: 2.0
+        """
+        try:
+            self._evaluate_all(await self._probe_all_async())
+        finally:
+            self.contexts.close()
+        self._compact_perfdata()
+
+    @property
+    def is_async(self):
+        """True if at least one resource has an asynchronous probe.
+
+        Asynchronous probes are either coroutine functions
+        (``async def``) or async generators. Read-only property.
+
+        .. versionadded:: 2.0
+        """
+        return any(_is_async(resource) for resource in self.resources)
+
+    def _evaluate_all(self, probed):
+        for resource, metrics in zip(self.resources, probed):
+            self._evaluate_resource(resource, metrics)
+
+    def _compact_perfdata(self):
         self.perfdata = sorted([p for p in self.perfdata if p])
 
+    def _evaluate_concurrently(self):
+        """Probes resources on a thread pool and evaluates in order.
+
+        Only :meth:`Resource.probe` runs on the worker threads. Metrics
+        are evaluated in the controlling thread in the order in which
+        resources have been added, so results are the same as if
+        the resources had been probed sequentially.
+        """
+        probe, executor = self._create_executor(
+            min(self.max_workers, len(self.resources)))
+        futures = []
+        try:
+            for resource in self.resources:
+                futures.append(executor.submit(
+                    self._bind_context(probe), resource))
+            self._evaluate_all(future.result() for future in futures)
+        except BaseException:
+            # don't wait for probes which are still running, e.g. when
+            # the plugin's timeout strikes
+            _abandon(executor, futures)
+            raise
+        executor.shutdown()
+
+    def _evaluate_with_deadlines(self):
+        """Probes each resource within :attr:`resource_timeout`.
+
+        Resources are probed on daemon threads, at most
+        :attr:`max_workers` at a time (one if unset). A resource that
+        overruns its budget yields an Unknown result while the results
+        of all other resources are kept.
+        """
+        if self.executor != 'thread':
+            raise ValueError('resource_timeout requires thread executor',
+                             self.executor)
+        slots = threading.Semaphore(self.max_workers or 1)
+        tasks = [_DeadlineTask(resource, slots) for resource in
+                 self.resources]
+        for task in tasks:
+            task.start()
+        for task in tasks:
+            probed = task.join_until_deadline(self.resource_timeout)
+            if probed is None:
+                _log.warning('resource %s exceeded its time budget of %ss',
+                             task.resource.name, self.resource_timeout)
+                probed = _overrun(task.resource, self.resource_timeout)
+            self._evaluate_resource(task.resource, probed)
+
+    def _bind_context(self, probe):
+        """Lets `probe` run in a copy of the current context.
+
+        Thread workers thus log to the caller's runtime. This is not
+        possible (and not necessary) for worker processes.
+        """
+        if self.executor == 'thread':
+            return functools.partial(contextvars.copy_context().run, probe)
+        return probe
+
+    def _create_executor(self, max_workers):
+        """Creates worker pool according to :attr:`executor`.
+
+        :returns: (probe function, executor) tuple
+        """
+        if self.executor == 'thread':
+            return _probe, _DaemonThreadPool(max_workers)
+        elif self.executor == 'process':
+            return (_probe_detached,
+                    concurrent.futures.ProcessPoolExecutor(max_workers))
+        raise ValueError('unknown executor type', self.executor)
+
+    async def _probe_all_async(self):
+        """Probes asynchronous resources on the running event loop.
+
+        Synchronous resources are handed over to a worker pool with
+        :attr:`max_workers` workers (one if unset) so that they do not
+        block the event loop. If the probes get cancelled (e.g., due to
+        a timeout), the pool is shut down without waiting. Probes that
+        exceed :attr:`resource_timeout` are cancelled individually.
+        """
+        import asyncio
+        loop = asyncio.get_running_loop()
+        probe, executor = self._create_executor(self.max_workers or 1)
+
+        async def probe_within_deadline(resource):
+            if _is_async(resource):
+                aw = _probe_async(resource)
+            else:
+                aw = loop.run_in_executor(
+                    executor, self._bind_context(probe), resource)
+            if not self.resource_timeout:
+                return await aw
+            try:
+                return await asyncio.wait_for(aw, self.resource_timeout)
+            except asyncio.TimeoutError:
+                _log.warning('resource %s exceeded its time budget of %ss',
+                             resource.name, self.resource_timeout)
+                return _overrun(resource, self.resource_timeout)
+
+        try:
+            probed = await asyncio.gather(*[
+                probe_within_deadline(resource)
+                for resource in self.resources])
+        except BaseException:
+            _abandon(executor, [])
+            raise
+        executor.shutdown(wait=False)
+        return probed
+
     def set_verbose(self, verbose):
         """Parses either numerical or alphabetical verbosity specification.
 
@@ -124,7 +539,8 @@ class Check(object):
 
         :param verbose: output verbosity level between 0 and 3
         :param timeout: abort check execution with a :exc:`Timeout`
-            exception after so many seconds (use 0 for no timeout)
+            exception after so many seconds, fractions allowed (use 0
+            for no timeout)
         :return: (output, exitcode) tuple
 
         .. versionadded:: 2.0
@@ -132,7 +548,7 @@ class Check(object):
 
         self.set_verbose(verbose)
         if timeout is not None:
-            self.timeout = int(timeout)
+            self.timeout = float(timeout)
         runtime = Runtime()
         return runtime.execute(self)
 
@@ -144,12 +560,35 @@ class Check(object):
 
         :param verbose: output verbosity level between 0 and 3
         :param timeout: abort check execution with a :exc:`Timeout`
-            exception after so many seconds (use 0 for no timeout)
+            exception after so many seconds, fractions allowed (use 0
+            for no timeout)
         """
         output, exitcode = self.run(verbose, timeout)
         print(output, end='')
         sys.exit(exitcode)
 
+    async def arun(self, verbose=None, timeout=None):
+        """Asynchronous main entry point.
+
+        Like :meth:`run`, but to be awaited from a running event loop.
+        All resources are probed concurrently on that loop. When the
+        check times out, pending probes are cancelled and a
+        :exc:`Timeout` exception is raised.
+
+        :param verbose: output verbosity level between 0 and 3
+        :param timeout: abort check execution with a :exc:`Timeout`
+            exception after so many seconds, fractions allowed (use 0
+            for no timeout)
+        :return: (output, exitcode) tuple
+
+        .. versionadded:: 2.0
+        """
+        self.set_verbose(verbose)
+        if timeout is not None:
+            self.timeout = float(timeout)
+        runtime = Runtime()
+        return await runtime.execute_async(self)
+
     @property
     def state(self):
         """Overall check state.
@@ -9,13 +9,15 @@ context's `name`. The same context may be used for several metrics.
 
 Plugin authors may just use to :class:`ScalarContext` in the majority of cases.
 Sometimes is better to subclass :class:`Context` instead to implement custom
-evaluation or performance data logic.
+evaluation or performance data logic. :class:`RateContext` turns
+monotonically increasing counters into per-second rates.
 """
 
 from .performance import Performance
 from .range import Range
 from .result import Result
 from .state import Ok, Warn, Critical
+import time
 
 
 class Context(object):
@@ -101,6 +103,16 @@ class Context(object):
                 valueunit=metric.valueunit, min=metric.min, max=metric.max,
                 context=self)
 
+    def close(self):
+        """Releases resources held during evaluation.
+
+        The :class:`~.check.Check` controller calls this method once
+        after all metrics have been evaluated. This base implementation
+        does nothing.
+
+        .. versionadded:: 2.0
+        """
+
 
 class ScalarContext(Context):
 
@@ -162,6 +174,119 @@ class ScalarContext(Context):
                            metric.min, metric.max)
 
 
+class RateContext(ScalarContext):
+
+    def __init__(self, name, cookie, warning=None, critical=None,
+                 fmt_metric='{name} is {valueunit}/s', result_cls=Result,
+                 wrap=None):
+        """Evaluates per-second rates of counter metrics.
+
+        Metrics associated with a RateContext carry the current value of
+        a monotonically increasing counter (bytes transferred, requests
+        served, ...). The context remembers value and time of each
+        metric in `cookie` and evaluates the rate since the previous
+        invocation against the warning and critical ranges like
+        :class:`ScalarContext` does.
+
+        Several rate contexts may share the same cookie. The cookie is
+        opened on the first evaluation (unless it is open already) and
+        committed and closed by :meth:`close`, so the samples of all
+        metrics of a check are read and written in one go. Samples are
+        stored under the metric's name.
+
+        If there is no previous sample, or the counter has decreased
+        (for example, because the monitored service has been restarted),
+        no rate can be computed. The metric is then evaluated as Ok and
+        does not produce performance data.
+
+        :attr:`name`, :attr:`warning`, :attr:`critical`,
+        :attr:`fmt_metric`, and :attr:`result_cls` are described in
+        :class:`ScalarContext`.
+
+        :param cookie: :class:`~.cookie.Cookie` or
+            :class:`~.cookie.SQLiteCookie` which keeps the samples
+        :param wrap: counter range for counters which wrap around
+            instead of being reset (e.g., 2**32 for 32-bit SNMP
+            counters)
+
+        .. versionadded:: 2.0
+        """
+        super(RateContext, self).__init__(
+            name, warning, critical, fmt_metric, result_cls)
+        self.cookie = cookie
+        self.wrap = wrap
+        self._opened = False
+        self._rates = {}
+
+    def rate(self, metric):
+        """Computes the rate of `metric` since the previous invocation.
+
+        The current sample is recorded in the cookie. Repeated calls
+        for the same metric return the same result.
+
+        :returns: (rate, reason) tuple; rate is None if it cannot be
+            computed and reason explains why
+        """
+        if metric.name in self._rates:
+            return self._rates[metric.name]
+        if self.cookie.closed:
+            self.cookie.open()
+            self._opened = True
+        now = time.time()
+        previous = self.cookie.get(metric.name)
+        self.cookie[metric.name] = [metric.value, now]
+        if not previous:
+            result = None, 'first sample'
+        else:
+            value, timestamp = previous
+            delta = metric.value - value
+            if delta < 0 and self.wrap:
+                delta += self.wrap
+            if delta < 0:
+                result = None, 'counter reset'
+            elif now <= timestamp:
+                result = None, 'no time elapsed'
+            else:
+                result = delta / (now - timestamp), None
+        self._rates[metric.name] = result
+        return result
+
+    def evaluate(self, metric, resource):
+        """Compares the metric's rate with warning and critical ranges.
+
+        :returns: :class:`~nagiosplugin.result.Result` object
+        """
+        rate, reason = self.rate(metric)
+        if rate is None:
+            return self.result_cls(Ok, '{0} rate unknown ({1})'.format(
+                metric.name, reason), metric)
+        return super(RateContext, self).evaluate(
+            metric.replace(value=rate, max=None), resource)
+
+    def performance(self, metric, resource):
+        """Derives performance data from the metric's rate.
+
+        :returns: :class:`~nagiosplugin.performance.Performance` object
+            or None if the rate is unknown
+        """
+        rate, _ = self.rate(metric)
+        if rate is None:
+            return None
+        return super(RateContext, self).performance(
+            metric.replace(value=rate, max=None), resource)
+
+    def close(self):
+        """Commits and closes the cookie if this context opened it."""
+        self._rates = {}
+        if not self._opened:
+            return
+        self._opened = False
+        try:
+            self.cookie.commit()
+        finally:
+            self.cookie.close()
+
+
 class Contexts:
     """Container for collecting all generated contexts."""
 
@@ -186,3 +311,8 @@ class Contexts:
 
     def __iter__(self):
         return iter(self.by_name)
+
+    def close(self):
+        """Calls :meth:`Context.close` on all contexts."""
+        for context in self.by_name.values():
+            context.close()
@@ -9,36 +9,89 @@ application of cookies to get only new lines of a continuously growing
 file.
 
 Cookies are locked exclusively so that at most one process at a time has
-access to it. Changes to the dict are not reflected in the file until
+access to it. Read-only cookies take a shared lock instead, so that any
+number of readers can inspect the state while no writer is active.
+Changes to the dict are not reflected in the file until
 :meth:`Cookie.commit` is called. It is recommended to use Cookie as
 context manager to get it opened and committed automatically.
+
+By default, the state file is rewritten in place. Atomic cookies write a
+new state file and rename it over the old one instead, so that a crash
+during :meth:`Cookie.commit` never leaves a truncated state file behind.
+They are locked via a separate lock file (state file name plus
+".lock"), which is left in place.
+
+Cookies keep a digest of the content they have loaded or committed
+last. Commits which would not change the state file are skipped, so that
+plugins which only read their state do not cause disk writes.
+
+:class:`SQLiteCookie` is an alternative backend which keeps the state of
+many plugins in a single SQLite database.
 """
 
 from .compat import UserDict, TemporaryFile
-from .platform import flock_exclusive
+from .error import CheckError
+from .platform import flock_exclusive, flock_shared
 import codecs
+import hashlib
 import json
+import logging
 import os
+import sqlite3
+import stat
+import tempfile
+import time
+
+_log = logging.getLogger(__name__)
 
 
 class Cookie(UserDict, object):
 
-    def __init__(self, statefile=None):
+    durability_modes = ('fsync', 'fdatasync', 'none')
+
+    def __init__(self, statefile=None, atomic=False, durability='fsync',
+                 mode='w', lock_timeout=None):
         """Creates a persistent dict to keep state.
 
         After creation, a cookie behaves like a normal dict.
 
         :param statefile: file name to save the dict's contents
+        :param atomic: replace the state file atomically on commit
+            instead of rewriting it in place
+        :param durability: how to flush committed content to disk:
+            "fsync" (default) syncs data and metadata, "fdatasync" only
+            syncs data (falls back to fsync where not available), and
+            "none" leaves writeback to the operating system; use the
+            relaxed modes only for state which can be regenerated
+        :param mode: "w" (default) to lock the state file exclusively
+            or "r" to take a shared lock; read-only cookies cannot
+            commit changes
+        :param lock_timeout: give up with :class:`~.error.CheckError`
+            if the lock cannot be acquired within so many seconds
+            (default: wait indefinitely)
 
         .. note:: If `statefile` is empty or None, the Cookie will be
            oblivous, i.e., it will forget its contents on garbage
            collection. This makes it possible to explicitely throw away
            state between plugin runs (for example by a command line
            argument).
+
+        .. versionchanged:: 2.0
+           Added `atomic`, `durability`, `mode`, and `lock_timeout`
+           parameters.
         """
+        if durability not in self.durability_modes:
+            raise ValueError('unknown durability mode', durability)
+        if mode not in ('r', 'w'):
+            raise ValueError('unknown cookie mode', mode)
         super(Cookie, self).__init__()
         self.path = statefile
+        self.atomic = atomic and bool(statefile)
+        self.durability = durability
+        self.mode = mode
+        self.lock_timeout = lock_timeout
         self.fobj = None
+        self._digest = None
 
     def __enter__(self):
         """Allows Cookie to be used as context manager.
@@ -68,38 +121,118 @@ class Cookie(UserDict, object):
         plugins will not fail repeatedly when their state files get
         damaged.
 
+        Read-only cookies acquire a shared lock and neither create nor
+        truncate the state file.
+
         :returns: Cookie object (self)
         :raises ValueError: if the state file is corrupted or does not
             deserialize into a dict
+        :raises CheckError: if the lock cannot be acquired within
+            `lock_timeout`
         """
         self.fobj = self._create_fobj()
-        flock_exclusive(self.fobj)
-        if os.fstat(self.fobj.fileno()).st_size:
-            try:
-                self.data = self._load()
-            except ValueError:
-                self.fobj.truncate(0)
-                raise
+        try:
+            self._lock()
+        except CheckError:
+            self.close()
+            raise
+        statefobj = self._open_statefile() if self.atomic else self.fobj
+        try:
+            if statefobj and os.fstat(statefobj.fileno()).st_size:
+                self.data = self._load(statefobj)
+        except ValueError:
+            if self.mode == 'w':
+                self._discard()
+            raise
+        finally:
+            if statefobj and statefobj is not self.fobj:
+                statefobj.close()
+        self._digest = _digest(self._serialize())
         return self
 
+    def _lock(self):
+        flock = flock_shared if self.mode == 'r' else flock_exclusive
+        if flock(self.fobj, blocking=False):
+            return
+        start = time.monotonic()
+        if self.lock_timeout is None:
+            flock(self.fobj)
+        else:
+            delay = 0.001
+            while not flock(self.fobj, blocking=False):
+                remaining = start + self.lock_timeout - time.monotonic()
+                if remaining <= 0:
+                    raise CheckError('cannot lock cookie {0} within {1}s'
+                                     .format(self.path, self.lock_timeout))
+                time.sleep(min(delay, remaining))
+                delay = min(delay * 2, 0.1)
+        _log.debug('waited %.3fs for lock on cookie %s',
+                   time.monotonic() - start, self.path)
+
     def _create_fobj(self):
         if not self.path:
             return TemporaryFile('w+', encoding='ascii',
                                  prefix='oblivious_cookie_')
+        if self.atomic:
+            return open(self.path + '.lock', 'a')
+        if self.mode == 'r':
+            return self._open_statefile() or TemporaryFile(
+                'w+', encoding='ascii', prefix='oblivious_cookie_')
         # mode='a+' has problems with mixed R/W operation on Mac OS X
         try:
             return codecs.open(self.path, 'r+', encoding='ascii')
         except IOError:
             return codecs.open(self.path, 'w+', encoding='ascii')
 
-    def _load(self):
-        self.fobj.seek(0)
-        data = json.load(self.fobj)
+    def _open_statefile(self):
+        try:
+            return codecs.open(self.path, 'r', encoding='ascii')
+        except IOError:
+            return None
+
+    def _load(self, fobj):
+        fobj.seek(0)
+        data = json.load(fobj)
         if not isinstance(data, dict):
             raise ValueError('format error: cookie does not contain dict',
                              self.path, data)
         return data
 
+    def _discard(self):
+        """Empties a damaged state file."""
+        if self.atomic:
+            self._replace('')
+        else:
+            self.fobj.truncate(0)
+
+    def _serialize(self):
+        return json.dumps(self.data) + '\n'
+
+    @property
+    def dirty(self):
+        """True if the content differs from the state file.
+
+        Changes are detected by comparing serialized forms, so
+        modifications of nested objects are noticed as well.
+
+        .. versionadded:: 2.0
+        """
+        return _digest(self._serialize()) != self._digest
+
+    def _sync(self, fd):
+        if self.durability == 'fdatasync' and hasattr(os, 'fdatasync'):
+            os.fdatasync(fd)
+        elif self.durability != 'none':
+            os.fsync(fd)
+
+    @property
+    def closed(self):
+        """True unless the cookie has been opened.
+
+        .. versionadded:: 2.0
+        """
+        return self.fobj is None
+
     def close(self):
         """Closes a cookie and its underlying state file.
 
@@ -117,13 +250,227 @@ class Cookie(UserDict, object):
 
         The cookies content is serialized as JSON string and saved to
         the state file. The buffers are flushed to ensure that the new
-        content is saved in a durable way.
+        content is saved in a durable way (see the `durability`
+        parameter). If the content has not been changed since it was
+        loaded or committed last, the state file is not touched at all.
+
+        .. versionchanged:: 2.0
+           Skip unchanged content.
         """
         if not self.fobj:
             raise IOError('cannot commit closed cookie', self.path)
-        self.fobj.seek(0)
-        self.fobj.truncate()
-        json.dump(self.data, self.fobj)
-        self.fobj.write('\n')
-        self.fobj.flush()
-        os.fsync(self.fobj)
+        serialized = self._serialize()
+        digest = _digest(serialized)
+        if digest == self._digest:
+            return
+        if self.mode == 'r':
+            raise IOError('cannot commit read-only cookie', self.path)
+        if self.atomic:
+            self._replace(serialized)
+        else:
+            self.fobj.seek(0)
+            self.fobj.truncate()
+            self.fobj.write(serialized)
+            self.fobj.flush()
+            self._sync(self.fobj.fileno())
+        self._digest = digest
+
+    def _replace(self, content):
+        """Writes `content` to a new file and renames it to the state file.
+
+        The new file is synced to disk before renaming. Afterwards, the
+        directory is synced to make the rename durable (unless
+        durability is "none"). The new file gets the permissions of the
+        state file it replaces, or the umask-derived default if there is
+        no state file yet, so that other users can still read it.
+        """
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmpname = tempfile.mkstemp(
+            dir=directory, prefix='.' + os.path.basename(self.path) + '.')
+        try:
+            os.chmod(tmpname, _file_mode(self.path))
+            with os.fdopen(fd, 'w', encoding='ascii') as f:
+                f.write(content)
+                f.flush()
+                self._sync(f.fileno())
+            os.replace(tmpname, self.path)
+        except BaseException:
+            os.unlink(tmpname)
+            raise
+        if self.durability != 'none':
+            _fsync_directory(directory)
+
+
+class SQLiteCookie(Cookie):
+    """Cookie backed by a shared SQLite database.
+
+    Each item is stored as separate row, keyed by the cookie's namespace
+    and the item's key. The database is operated in write-ahead logging
+    mode, so many plugins can read their state concurrently and writers
+    lock the database only for the duration of :meth:`commit`. Only
+    items which have been changed, added or removed are written.
+
+    .. versionadded:: 2.0
+    """
+
+    _synchronous = dict(fsync='FULL', fdatasync='NORMAL', none='OFF')
+
+    def __init__(self, database, namespace, migrate_from=None,
+                 durability='fsync', timeout=10):
+        """Creates a persistent dict stored in `database`.
+
+        :param database: file name of the SQLite database; if empty or
+            None, the cookie is oblivious (see :class:`Cookie`)
+        :param namespace: name which separates this cookie's items from
+            other cookies in the same database, e.g. the plugin's name
+            and the monitored service
+        :param migrate_from: file name of a JSON state file written by
+            :class:`Cookie`; its content is imported if the namespace
+            does not contain any items yet. The file is left untouched.
+        :param durability: see :class:`Cookie`; mapped to SQLite's
+            synchronous setting
+        :param timeout: wait so many seconds for other writers before
+            giving up
+        """
+        super(SQLiteCookie, self).__init__(database, durability=durability)
+        self.namespace = namespace
+        self.migrate_from = migrate_from
+        self.timeout = timeout
+        self.conn = None
+        self._rows = {}
+
+    def open(self):
+        """Connects to the database and loads the namespace's items.
+
+        The database and its table are created if necessary. Items
+        which cannot be deserialized are deleted before raising an
+        exception.
+
+        :returns: SQLiteCookie object (self)
+        :raises ValueError: if an item is corrupted
+        """
+        self.conn = sqlite3.connect(self.path or ':memory:',
+                                    timeout=self.timeout, isolation_level=None)
+        try:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('PRAGMA synchronous={0}'.format(
+                self._synchronous[self.durability]))
+            self.conn.execute(
+                'CREATE TABLE IF NOT EXISTS cookie ('
+                'namespace TEXT NOT NULL, key TEXT NOT NULL, '
+                'value TEXT NOT NULL, PRIMARY KEY (namespace, key))')
+            self._rows = dict(self.conn.execute(
+                'SELECT key, value FROM cookie WHERE namespace = ?',
+                (self.namespace,)))
+        except sqlite3.Error:
+            self.close()
+            raise
+        try:
+            self.data = dict((key, json.loads(value))
+                             for key, value in self._rows.items())
+        except ValueError:
+            self.conn.execute('DELETE FROM cookie WHERE namespace = ?',
+                              (self.namespace,))
+            self._rows = {}
+            self.close()
+            raise ValueError('format error: corrupted cookie',
+                             self.path, self.namespace)
+        if not self._rows and self.migrate_from:
+            try:
+                self.data = self._migrate()
+            except Exception:
+                self.close()
+                raise
+        return self
+
+    def _migrate(self):
+        if not os.path.exists(self.migrate_from):
+            return {}
+        # read-only, so that a damaged state file is not truncated
+        cookie = Cookie(self.migrate_from, mode='r').open()
+        try:
+            return cookie.data
+        finally:
+            cookie.close()
+
+    @property
+    def closed(self):
+        return self.conn is None
+
+    def close(self):
+        """Closes the database connection.
+
+        This method has no effect if the cookie is already closed.
+        """
+        if not self.conn:
+            return
+        self.conn.close()
+        self.conn = None
+
+    def _changes(self):
+        rows = dict((str(key), json.dumps(value))
+                    for key, value in self.data.items())
+        updated = [(self.namespace, key, value) for key, value in rows.items()
+                   if self._rows.get(key) != value]
+        deleted = [(self.namespace, key) for key in self._rows
+                   if key not in rows]
+        return rows, updated, deleted
+
+    @property
+    def dirty(self):
+        """True if items have been changed, added or removed."""
+        _rows, updated, deleted = self._changes()
+        return bool(updated or deleted)
+
+    def commit(self):
+        """Writes changed items to the database in a single transaction.
+
+        Unchanged items are not written. If nothing has been changed,
+        the database is not touched at all.
+        """
+        if not self.conn:
+            raise IOError('cannot commit closed cookie', self.path)
+        rows, updated, deleted = self._changes()
+        if not (updated or deleted):
+            return
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO cookie (namespace, key, value) '
+                'VALUES (?, ?, ?)', updated)
+            self.conn.executemany(
+                'DELETE FROM cookie WHERE namespace = ? AND key = ?', deleted)
+        except BaseException:
+            self.conn.execute('ROLLBACK')
+            raise
+        self.conn.execute('COMMIT')
+        self._rows = rows
+
+
+def _digest(serialized):
+    return hashlib.sha1(serialized.encode('ascii')).digest()
+
+
+def _file_mode(path):
+    """Returns the permission bits of `path` or the default for new files.
+
+    mkstemp creates files readable only by the owner. Files created with
+    open() get 0666 minus the umask, which can only be determined by
+    setting it.
+    """
+    try:
+        return stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        umask = os.umask(0o022)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+
+def _fsync_directory(directory):
+    if os.name != 'posix':  # pragma: no cover
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
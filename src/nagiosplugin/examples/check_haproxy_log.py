@@ -13,13 +13,17 @@ compute both metric and context names. The default is to check for the
 50th and 95th percentile. The `MultiArg` class is used to specify sets
 of thresholds. It has the nice property to fill up missing values so the
 user is free in how many thresholds he specifies.
+
+New log data is processed in chunks: LogTail's prefilter drops lines
+which do not come from haproxy, and a :class:`nagiosplugin.FieldExtractor`
+pulls out t_tot and the status code of all requests in a chunk at once.
+Request times are collected in a :class:`nagiosplugin.Histogram`, so
+memory usage does not grow with the number of requests.
 """
 
 import argparse
 import itertools
 import nagiosplugin
-import numpy
-import re
 
 
 class HAProxyLog(nagiosplugin.Resource):
@@ -30,8 +34,10 @@ class HAProxyLog(nagiosplugin.Resource):
     to compute the error rate.
     """
 
-    r_logline = re.compile(
-        r'haproxy.*: [0-9.:]+ \[\S+\] .* \d+/\d+/\d+/\d+/(\d+) (\d\d\d) ')
+    fields = nagiosplugin.FieldExtractor(
+        rb'haproxy.*: [0-9.:]+ \[\S+\] .* '
+        rb'\d+/\d+/\d+/\d+/(?P<ttot>\d+) (?P<status>\d\d\d) ',
+        ttot=int, status=int)
 
     def __init__(self, logfile, statefile, percentiles):
         self.logfile = logfile
@@ -39,30 +45,29 @@ class HAProxyLog(nagiosplugin.Resource):
         self.percentiles = percentiles
 
     def parse_log(self):
-        """Yields ttot and error status for each log line."""
+        """Yields columns of ttot and status for each chunk of new lines."""
         cookie = nagiosplugin.Cookie(self.statefile)
-        with nagiosplugin.LogTail(self.logfile, cookie) as lf:
-            for line in lf:
-                match = self.r_logline.search(line.decode())
-                if not match:
-                    continue
-                ttot, stat = match.groups()
-                err = not (stat.startswith('2') or stat.startswith('3'))
-                yield int(ttot), err
+        with nagiosplugin.LogTail(self.logfile, cookie, batch='chunks',
+                                  prefilter=b'haproxy') as lf:
+            for chunk in lf:
+                yield self.fields.extract(chunk)
 
     def probe(self):
         """Computes error rate and t_tot percentiles."""
-        d = numpy.fromiter(self.parse_log(), dtype=[
-            ('ttot', numpy.int32), ('err', numpy.uint16)])
-        requests = len(d['err'])
+        ttot = nagiosplugin.Histogram()
+        errors = 0
+        for columns in self.parse_log():
+            ttot.update(columns['ttot'])
+            status = columns['status']
+            errors += len(status) - self.fields.count(status, 200, 400)
+        requests = len(ttot)
         metrics = []
         if requests:
-            for pct in self.percentiles:
+            for pct, value in zip(self.percentiles, ttot.percentiles(
+                    [int(pct) for pct in self.percentiles])):
                 metrics.append(nagiosplugin.Metric(
-                    'ttot%s' % pct, numpy.percentile(
-                        d['ttot'], int(pct)) / 1000.0, 's', 0))
-        error_rate = (100 * numpy.sum(d['err'] / requests)
-                      if requests else 0)
+                    'ttot%s' % pct, value / 1000.0, 's', 0))
+        error_rate = 100 * errors / requests if requests else 0
         metrics += [nagiosplugin.Metric('error_rate', error_rate, '%', 0, 100),
                     nagiosplugin.Metric('request_total', requests, min=0,
                                         context='default')]
@@ -0,0 +1,132 @@
+"""Extract columns of fields from blocks of log data.
+
+Parsing log files line by line means a regular expression search and a
+number of conversions per line, all executed by the interpreter.
+:class:`FieldExtractor` applies one compiled regular expression to a
+whole block of lines (for example, a chunk yielded by
+:class:`~.logtail.LogTail` in batch mode) and converts the matched
+fields column by column.
+
+If numpy is installed, columns are numpy arrays and numeric conversion
+is done by numpy in bulk. Otherwise, columns are :class:`array.array`
+objects (numbers) or lists (bytes). numpy is imported only when the
+first extractor is created, so that plugins which do not use it do not
+pay for its import time.
+
+.. versionadded:: 2.0
+"""
+
+import array
+import re
+
+
+def _import_numpy():
+    try:
+        import numpy
+    except ImportError:  # pragma: no cover
+        return None
+    return numpy
+
+
+class FieldExtractor(object):
+    """Converts matches of a regular expression into columns."""
+
+    _dtypes = {int: 'int64', float: 'float64'}
+    _typecodes = {int: 'q', float: 'd'}
+
+    def __init__(self, pattern, use_numpy=None, **fields):
+        """Creates extractor.
+
+        :param pattern: bytes regular expression (string or compiled)
+            with a named group for each field; it is matched against
+            each line
+        :param use_numpy: return numpy arrays (default: if numpy is
+            installed)
+        :param fields: field names and types (int, float, or bytes);
+            the names must correspond to named groups in `pattern`
+
+        Example::
+
+            FieldExtractor(rb' (?P<status>\\d{3}) (?P<size>\\d+) ',
+                           status=int, size=int)
+        """
+        if isinstance(pattern, bytes):
+            pattern = re.compile(pattern, re.MULTILINE)
+        self.pattern = pattern
+        missing = set(fields) - set(pattern.groupindex)
+        if missing:
+            raise ValueError('no group for fields in pattern', missing)
+        for name, type_ in fields.items():
+            if type_ not in (int, float, bytes):
+                raise ValueError('unsupported field type', name, type_)
+        self.fields = fields
+        self.numpy = None if use_numpy is False else _import_numpy()
+        if use_numpy and self.numpy is None:
+            raise ValueError('numpy is not installed')
+        self.use_numpy = self.numpy is not None
+        # findall returns tuples of all groups in pattern order
+        self._index = dict((name, pattern.groupindex[name] - 1)
+                           for name in fields)
+        self._single = pattern.groups == 1
+
+    def extract(self, block):
+        """Extracts all fields from `block`.
+
+        :param block: bytes or memoryview containing complete lines
+        :returns: dict mapping field names to columns of equal length
+        """
+        matches = self.pattern.findall(block)
+        if self._single:
+            rows = [matches]
+        else:
+            rows = list(zip(*matches)) if matches else [
+                () for _ in range(self.pattern.groups)]
+        return dict((name, self._column(rows[self._index[name]], type_))
+                    for name, type_ in self.fields.items())
+
+    def _column(self, values, type_):
+        if self.use_numpy:
+            column = self.numpy.array(values, dtype=bytes)
+            if type_ is bytes:
+                return column
+            return column.astype(self._dtypes[type_])
+        if type_ is bytes:
+            return list(values)
+        return array.array(self._typecodes[type_], map(type_, values))
+
+    def count(self, column, low=None, high=None):
+        """Counts values with `low` <= value < `high`.
+
+        Numpy columns are compared as a whole instead of value by value.
+
+        :param column: numeric column as returned by :meth:`extract`
+        :param low: lower bound (inclusive), or None for no bound
+        :param high: upper bound (exclusive), or None for no bound
+        """
+        if self.use_numpy:
+            mask = self.numpy.ones(len(column), dtype=bool)
+            if low is not None:
+                mask &= column >= low
+            if high is not None:
+                mask &= column < high
+            return int(mask.sum())
+        return sum(1 for value in column
+                   if (low is None or value >= low) and
+                   (high is None or value < high))
+
+    def extract_all(self, blocks):
+        """Extracts fields from several blocks and joins the columns."""
+        parts = [self.extract(block) for block in blocks]
+        return dict((name, self._concatenate([p[name] for p in parts],
+                                             type_))
+                    for name, type_ in self.fields.items())
+
+    def _concatenate(self, columns, type_):
+        if self.use_numpy:
+            if not columns:
+                return self._column([], type_)
+            return self.numpy.concatenate(columns)
+        result = self._column([], type_)
+        for column in columns:
+            result.extend(column)
+        return result
@@ -0,0 +1,200 @@
+"""Streaming histograms for percentile estimation.
+
+Computing exact percentiles requires to keep all values, which does not
+scale well with the amount of data a plugin processes (think of request
+times extracted from a web server's log file). :class:`Histogram`
+collects values into log-linear buckets instead, in the manner of HDR
+histograms: each power of two is divided into equally sized
+sub-buckets, so that the relative error of all values is bounded by the
+chosen precision. Memory usage depends only on the range of values, not
+on their number. All percentiles are answered from one pass over the
+buckets.
+
+Histograms can be merged and serialized into plain dicts, so that they
+can be kept in a :class:`~.cookie.Cookie`. :func:`rolling_window` uses
+this to compute percentiles over the last minutes or hours of data
+across plugin invocations.
+
+.. versionadded:: 2.0
+"""
+
+import math
+import sys
+import time
+
+
+class Histogram(object):
+    """Sparse log-linear histogram of non-negative values."""
+
+    def __init__(self, precision=2, resolution=1):
+        """Creates empty histogram.
+
+        :param precision: number of significant decimal digits; values
+            are kept with a relative error of at most 10^-precision
+        :param resolution: smallest distinguishable value; values are
+            counted as multiples of `resolution`
+        """
+        self.precision = precision
+        self.resolution = resolution
+        self.subbits = int(math.ceil(math.log2(2 * 10 ** precision)))
+        self.subcount = 1 << self.subbits
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def _key(self, n):
+        shift = max(0, n.bit_length() - self.subbits)
+        return shift * (self.subcount >> 1) + (n >> shift)
+
+    def _value(self, key):
+        """Returns the representative value of bucket `key`."""
+        if key < self.subcount:
+            return key * self.resolution
+        shift = (key - self.subcount) // (self.subcount >> 1) + 1
+        lower = (key - shift * (self.subcount >> 1)) << shift
+        return (lower + ((1 << shift) - 1) / 2) * self.resolution
+
+    def add(self, value, count=1):
+        """Records `value` `count` times.
+
+        :raises ValueError: if value is negative
+        """
+        if value < 0:
+            raise ValueError('cannot record negative value', value)
+        key = self._key(int(value / self.resolution))
+        self.counts[key] = self.counts.get(key, 0) + count
+        self.count += count
+        self.total += value * count
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        return self
+
+    def update(self, values):
+        """Records all values from iterable `values`.
+
+        numpy arrays are bucketed in bulk.
+        """
+        # numpy arrays can only exist if someone has imported numpy
+        numpy = sys.modules.get('numpy')
+        if numpy is not None and isinstance(values, numpy.ndarray):
+            return self._update_array(values, numpy)
+        for value in values:
+            self.add(value)
+        return self
+
+    def _update_array(self, values, numpy):
+        if not len(values):
+            return self
+        low, high = values.min().item(), values.max().item()
+        if low < 0:
+            raise ValueError('cannot record negative value', low)
+        n = (values / self.resolution).astype(numpy.int64)
+        # frexp's exponent equals int.bit_length() for integral values
+        shift = numpy.maximum(
+            0, numpy.frexp(n.astype(numpy.float64))[1] - self.subbits)
+        keys, counts = numpy.unique(
+            shift * (self.subcount >> 1) + (n >> shift), return_counts=True)
+        for key, count in zip(keys.tolist(), counts.tolist()):
+            self.counts[key] = self.counts.get(key, 0) + count
+        self.count += len(values)
+        self.total += values.sum().item()
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+        return self
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def mean(self):
+        """Exact arithmetic mean of all recorded values."""
+        return self.total / self.count if self.count else None
+
+    def percentiles(self, percents):
+        """Estimates several percentiles at once.
+
+        :param percents: list of percentiles (0-100)
+        :returns: list of values in the same order as `percents`, or
+            None values if the histogram is empty
+        """
+        if not self.count:
+            return [None for _ in percents]
+        ranks = sorted((max(1, math.ceil(float(p) / 100 * self.count)), i)
+                       for i, p in enumerate(percents))
+        result = [None] * len(ranks)
+        keys = iter(sorted(self.counts))
+        seen = 0
+        key = None
+        for rank, i in ranks:
+            while seen < rank:
+                key = next(keys)
+                seen += self.counts[key]
+            result[i] = min(max(self._value(key), self.min), self.max)
+        return result
+
+    def percentile(self, percent):
+        """Estimates a single percentile (0-100)."""
+        return self.percentiles([percent])[0]
+
+    def merge(self, other):
+        """Adds all values recorded in `other` to this histogram.
+
+        :raises ValueError: if the histograms have been created with
+            different parameters
+        """
+        if (other.precision, other.resolution) != (
+                self.precision, self.resolution):
+            raise ValueError('cannot merge histograms of different layout')
+        for key, count in other.counts.items():
+            self.counts[key] = self.counts.get(key, 0) + count
+        self.count += other.count
+        self.total += other.total
+        for value in (other.min, other.max):
+            if value is not None:
+                self.min = value if self.min is None else min(self.min, value)
+                self.max = value if self.max is None else max(self.max, value)
+        return self
+
+    def to_dict(self):
+        """Returns JSON-serializable representation."""
+        return dict(precision=self.precision, resolution=self.resolution,
+                    counts=sorted(self.counts.items()), total=self.total,
+                    min=self.min, max=self.max)
+
+    @classmethod
+    def from_dict(cls, data):
+        """Recreates histogram from the output of :meth:`to_dict`."""
+        histogram = cls(data['precision'], data['resolution'])
+        histogram.counts = dict((key, count) for key, count in data['counts'])
+        histogram.count = sum(histogram.counts.values())
+        histogram.total = data['total']
+        histogram.min = data['min']
+        histogram.max = data['max']
+        return histogram
+
+
+def rolling_window(cookie, key, histogram, window, now=None):
+    """Keeps histograms of several invocations in a cookie.
+
+    `histogram` is saved in `cookie` under `key`, together with the
+    histograms of previous invocations. Histograms older than `window`
+    seconds are discarded.
+
+    :param cookie: open :class:`~.cookie.Cookie`
+    :param key: cookie key
+    :param histogram: :class:`Histogram` with this invocation's values
+    :param window: length of the rolling window in seconds
+    :param now: current timestamp (default: now)
+    :returns: merged :class:`Histogram` over the whole window
+    """
+    now = time.time() if now is None else now
+    entries = [entry for entry in cookie.get(key, [])
+               if entry['time'] > now - window]
+    entries.append(dict(time=now, histogram=histogram.to_dict()))
+    cookie[key] = entries
+    merged = Histogram(histogram.precision, histogram.resolution)
+    for entry in entries:
+        merged.merge(Histogram.from_dict(entry['histogram']))
+    return merged
@@ -6,55 +6,662 @@ provides an iterator over new lines to the subordinate context. LogTail
 saves the last file position into the provided cookie object.
 As the path to the log file is saved in the cookie, several LogTail
 instances may share the same cookie.
+
+When the log file has been rotated since the last invocation, LogTail
+looks for the rotated file by its inode number and reads the lines which
+have been appended to it before rotation. Then it continues with the new
+log file. Rotated files which have been compressed (gzip, bzip2, xz) or
+copied (copytruncate) get a new inode; they are recognized by a
+fingerprint of their first bytes instead. Compressed files are
+decompressed on the fly and positions refer to uncompressed data.
+
+Iterating line by line is slow for large amounts of new data. In batch
+mode, LogTail reads big blocks and yields lists of lines or whole blocks
+cut at line boundaries instead. :class:`MMapLogTail` maps new data into
+memory so that it can be scanned without copying it at all.
+:class:`MultiLogTail` reads a set of log files concurrently.
 """
 
+from .cookie import SQLiteCookie
+import bz2
+import glob
+import gzip
+import hashlib
+import io
+import logging
+import lzma
+import mmap
 import os
+import queue
+import re
+import threading
+import time
+
+_log = logging.getLogger(__name__)
+
+# number of bytes at the start of a file used as fingerprint
+HEADSIZE = 256
+
+_decompressors = {'.gz': gzip.open, '.bz2': bz2.open, '.xz': lzma.open}
+_streams = (gzip.GzipFile, bz2.BZ2File, lzma.LZMAFile)
+
+# passed down the read pipeline for blocks dropped by the prefilter, so
+# that budgets and checkpoints see all data read
+_skipped = object()
 
 
 class LogTail(object):
 
-    def __init__(self, path, cookie):
+    batch_modes = (None, 'lines', 'chunks')
+
+    def __init__(self, path, cookie, batch=None, blocksize=1 << 20,
+                 rotated=None, max_bytes=None, max_lines=None,
+                 max_time=None, skip_backlog=None, checkpoint_bytes=None,
+                 checkpoint_interval=None, prefilter=None):
         """Creates new LogTail context.
 
         :param path: path to the log file that is to be observed
         :param cookie: :class:`~.cookie.Cookie` object to save the last
             file position
+        :param batch: None (default) to iterate over single lines,
+            "lines" to get lists of lines, or "chunks" to get
+            :class:`memoryview` objects containing a number of complete
+            lines
+        :param blocksize: number of bytes to read at once in batch mode
+        :param rotated: glob pattern or list of glob patterns matching
+            rotated log files (default: `path`.1, `path`.1.*, and
+            `path`-*)
+        :param max_bytes: stop after so many bytes have been consumed
+        :param max_lines: stop after so many lines have been consumed
+            (not supported with memoryviews)
+        :param max_time: stop after so many seconds
+        :param skip_backlog: skip to the end of a log file if more than
+            so many unseen bytes have piled up (for example, after an
+            outage)
+        :param checkpoint_bytes: save the position in the cookie and
+            commit it each time so many bytes have been consumed
+        :param checkpoint_interval: save the position in the cookie and
+            commit it at least every so many seconds
+        :param prefilter: bytes string or compiled bytes regular
+            expression; only lines which contain it (or match it
+            somewhere) are passed on
+
+        The prefilter is applied to whole blocks, so that lines which
+        are not of interest are dropped without creating objects for
+        them. With a prefilter, an incomplete line at the end of the
+        file is held back in all modes and chunks contain the matching
+        lines only. Byte budgets and checkpoints count all data read,
+        including dropped lines, and are checked after each block even
+        if the prefilter drops the whole block. The prefilter must not
+        match the empty string.
+
+        If a budget is exhausted, reading stops after the current item
+        and the position reached is saved. The next invocation
+        continues from there. :attr:`truncated` tells whether new data
+        has been left out.
+
+        Checkpoints preserve progress if the subordinate context is left
+        with an exception, e.g., :class:`~.error.Timeout`. Note that
+        checkpoints commit the whole cookie: keep data derived from the
+        lines consumed so far in the same cookie, so that it is saved
+        together with the position. Checkpoints require an atomic
+        :class:`~.cookie.Cookie` or a :class:`~.cookie.SQLiteCookie`, so
+        that a commit which is interrupted does not damage the state.
+
+        .. versionchanged:: 2.0
+           Added `batch`, `blocksize`, `rotated`, `max_bytes`,
+           `max_lines`, `max_time`, `skip_backlog`, `checkpoint_bytes`,
+           `checkpoint_interval`, and `prefilter` parameters.
         """
+        if batch not in self.batch_modes:
+            raise ValueError('unknown batch mode', batch)
+        if max_lines is not None and batch == 'chunks':
+            raise ValueError('cannot count lines in chunks')
         self.path = os.path.abspath(path)
         self.cookie = cookie
+        self.batch = batch
+        self.blocksize = blocksize
+        if rotated is None:
+            rotated = [glob.escape(self.path) + '.1',
+                       glob.escape(self.path) + '.1.*',
+                       glob.escape(self.path) + '-*']
+        elif isinstance(rotated, str):
+            rotated = [rotated]
+        self.rotated = rotated
+        self.max_bytes = max_bytes
+        self.max_lines = max_lines
+        self.max_time = max_time
+        self.skip_backlog = skip_backlog
+        self.checkpoint_bytes = checkpoint_bytes
+        self.checkpoint_interval = checkpoint_interval
+        if isinstance(prefilter, bytes):
+            prefilter = re.compile(re.escape(prefilter))
+        if ((checkpoint_bytes or checkpoint_interval) and cookie.path and
+                not (cookie.atomic or isinstance(cookie, SQLiteCookie))):
+            raise ValueError('checkpoints need an atomic cookie')
+        if prefilter is not None and prefilter.search(b'') is not None:
+            raise ValueError('prefilter matches the empty string',
+                             prefilter.pattern)
+        self.prefilter = prefilter
+        #: True if new data has been skipped or left for the next run
+        self.truncated = False
         self.logfile = None
+        self._successor = None
         self.stat = None
+        self.head = None
+        self.pos = 0
 
-    def _seek_if_applicable(self, fileinfo):
-        self.stat = os.stat(self.path)
-        if (self.stat.st_ino == fileinfo.get('inode', -1) and
-                self.stat.st_size >= fileinfo.get('pos', 0)):
-            self.logfile.seek(fileinfo['pos'])
+    def _seek_if_applicable(self, fileinfo, rotated=False):
+        self.stat = os.fstat(self.logfile.fileno())
+        self.head = _fingerprint(self.logfile)
+        self.pos = 0
+        if rotated or self._unchanged(fileinfo):
+            self.pos = fileinfo.get('pos', 0)
+            self.logfile.seek(self.pos)
+        if (self.skip_backlog is not None and
+                not isinstance(self.logfile, _streams) and
+                self.stat.st_size - self.pos > self.skip_backlog):
+            self._skip_to_end()
+
+    def _skip_to_end(self):
+        """Skips to the end of the last complete line."""
+        start = max(self.pos, self.stat.st_size - self.blocksize)
+        self.logfile.seek(start)
+        end = self.logfile.read(self.stat.st_size - start).rfind(b'\n') + 1
+        _log.info('%s: skipping %d bytes of backlog', self.logfile.name,
+                  start + end - self.pos)
+        self.pos = start + end if end else self.stat.st_size
+        self.logfile.seek(self.pos)
+        self.truncated = True
+
+    def _unchanged(self, fileinfo):
+        """Checks if the log file is the one described by `fileinfo`.
+
+        Besides the inode number, the file's fingerprint must match
+        since inode numbers are reused quickly after files have been
+        removed. A file shorter than the saved position has been
+        truncated.
+        """
+        st = os.fstat(self.logfile.fileno())
+        if st.st_ino != fileinfo.get('inode', -1):
+            return False
+        if st.st_size < fileinfo.get('pos', 0):
+            _log.debug('%s has been truncated', self.logfile.name)
+            return False
+        head = fileinfo.get('head')
+        return not head or _fingerprint(self.logfile, head[0]) == head
+
+    def _find_rotated(self, fileinfo):
+        """Looks for the file last read if it has been rotated away.
+
+        Candidates are recognized by their inode or, if they have been
+        compressed or copied, by their fingerprint.
+
+        :returns: file name or None
+        """
+        inode = fileinfo.get('inode')
+        if inode is None or self._unchanged(fileinfo):
+            return None
+        current = os.fstat(self.logfile.fileno())
+        head = fileinfo.get('head')
+        for pattern in self.rotated:
+            for candidate in sorted(glob.glob(pattern)):
+                try:
+                    st = os.stat(candidate)
+                except OSError:
+                    continue
+                if st.st_ino == current.st_ino:
+                    continue
+                if st.st_ino == inode and st.st_dev == current.st_dev:
+                    return candidate
+                if head and head[0] and self._matches(candidate, head):
+                    return candidate
+        return None
+
+    def _matches(self, candidate, head):
+        try:
+            with _open(candidate) as f:
+                return _fingerprint(f, head[0]) == head
+        except (OSError, EOFError, lzma.LZMAError):
+            return False
 
     def __enter__(self):
         """Seeks to the last seen position and reads new lines.
 
         The last file position is read from the cookie. If the log file
         has not been changed since the last invocation, LogTail seeks to
-        that position and reads new lines. Otherwise, the position saved
-        in the cookie is reset and LogTail reads from the beginning.
-        After leaving the subordinate context, the new position is saved
-        in the cookie and the cookie is closed.
+        that position and reads new lines. If the log file has been
+        rotated, the remaining lines of the rotated file are read first.
+        Otherwise (for example, if the log file has been truncated), the
+        position saved in the cookie is reset and LogTail reads from the
+        beginning. After leaving the subordinate context, the new
+        position is saved in the cookie and the cookie is closed.
+
+        In batch mode, an incomplete line at the end of the file is held
+        back until it has been completed. The saved position points
+        right after the last complete line yielded.
 
-        :yields: new lines as bytes strings
+        :yields: new lines as bytes strings, lists of lines, or
+            memoryviews (see `batch`)
         """
         self.logfile = open(self.path, 'rb')
         self.cookie.open()
-        self._seek_if_applicable(self.cookie.get(self.path, {}))
-        line = self.logfile.readline()
-        while len(line):
-            yield line
+        for item in self._tail(self.cookie.get(self.path, {})):
+            yield item
+
+    def _tail(self, fileinfo):
+        """Reads new data, starting with the rotated file if necessary."""
+        self.truncated = False
+        budget = dict(bytes=self.max_bytes, lines=self.max_lines, deadline=(
+            time.monotonic() + self.max_time if self.max_time else None))
+        checkpoint = dict(bytes=0, time=time.monotonic())
+        rotated = self._find_rotated(fileinfo)
+        if rotated:
+            _log.debug('%s has been rotated to %s', self.path, rotated)
+            self._successor, self.logfile = self.logfile, _open(rotated)
+            self._seek_if_applicable(fileinfo, rotated=True)
+            for item in self._consume(budget, checkpoint):
+                yield item
+            if budget.get('exhausted'):
+                # resume within the rotated file next time
+                return
+            self.logfile.close()
+            self.logfile, self._successor = self._successor, None
+            fileinfo = {}
+        self._seek_if_applicable(fileinfo)
+        for item in self._consume(budget, checkpoint):
+            yield item
+
+    def _consume(self, budget, checkpoint):
+        """Reads items from the current file within budget."""
+        for item in self._checkpoint(
+                self._limit(self._read(), budget), checkpoint):
+            if item is not _skipped:
+                yield item
+
+    def _limit(self, items, budget):
+        """Stops iteration over `items` when the budget is exhausted."""
+        if not any(v is not None for v in budget.values()):
+            for item in items:
+                yield item
+            return
+        last = self.pos
+        for item in items:
+            yield item
+            if budget['bytes'] is not None:
+                budget['bytes'] -= self.pos - last
+                last = self.pos
+            if budget['lines'] is not None and item is not _skipped:
+                budget['lines'] -= (len(item) if isinstance(item, list)
+                                    else 1)
+            if ((budget['bytes'] is not None and budget['bytes'] <= 0) or
+                    (budget['lines'] is not None and budget['lines'] <= 0) or
+                    (budget['deadline'] is not None and
+                     time.monotonic() >= budget['deadline'])):
+                budget['exhausted'] = True
+                self.truncated = (self._successor is not None or isinstance(
+                    self.logfile, _streams) or self.pos < self.stat.st_size)
+                if self.truncated:
+                    _log.info('%s: budget exhausted at position %d',
+                              self.logfile.name, self.pos)
+                return
+
+    def _checkpoint(self, items, state):
+        """Commits the position regularly while iterating over `items`.
+
+        The position is saved after the consumer has asked for the next
+        item, i.e., after it has processed the previous one.
+        """
+        if not (self.checkpoint_bytes or self.checkpoint_interval):
+            for item in items:
+                yield item
+            return
+        last = self.pos
+        for item in items:
+            yield item
+            state['bytes'] += self.pos - last
+            last = self.pos
+            now = time.monotonic()
+            if ((self.checkpoint_bytes and
+                 state['bytes'] >= self.checkpoint_bytes) or
+                    (self.checkpoint_interval and
+                     now - state['time'] >= self.checkpoint_interval)):
+                self.cookie[self.path] = self._fileinfo()
+                self.cookie.commit()
+                state.update(bytes=0, time=now)
+
+    def _read(self):
+        """Reads from the current position to the end of the file."""
+        if self.prefilter:
+            for lines, ends in self._filtered():
+                if not lines:
+                    yield _skipped
+                elif self.batch == 'lines':
+                    yield lines
+                elif self.batch == 'chunks':
+                    yield memoryview(b''.join(lines))
+                else:
+                    blockend = self.pos
+                    for line, self.pos in zip(lines, ends):
+                        yield line
+                    self.pos = blockend
+        elif self.batch == 'lines':
+            for block in self._blocks():
+                yield io.BytesIO(block).readlines()
+        elif self.batch == 'chunks':
+            for block in self._blocks():
+                yield memoryview(block)
+        else:
             line = self.logfile.readline()
+            while len(line):
+                self.pos += len(line)
+                yield line
+                line = self.logfile.readline()
+
+    def _filtered(self):
+        """Reads lists of lines which pass the prefilter.
+
+        :yields: (lines, ends) tuples, where ends contains the file
+            position after each line; lines is empty if the whole block
+            has been dropped
+        """
+        search = self.prefilter.search
+        for block in self._blocks():
+            base = self.pos - len(block)
+            lines = []
+            ends = []
+            match = search(block)
+            # blocks end with a newline, so each match lies within a line
+            while match and match.start() < len(block):
+                start = block.rfind(b'\n', 0, match.start()) + 1
+                end = block.find(b'\n', match.start()) + 1
+                lines.append(block[start:end])
+                ends.append(base + end)
+                match = search(block, end)
+            yield lines, ends
+
+    def _blocks(self):
+        """Reads blocks which end at a line boundary."""
+        rest = b''
+        while True:
+            block = self.logfile.read(self.blocksize)
+            if not block:
+                return
+            if rest:
+                block = rest + block
+            end = block.rfind(b'\n') + 1
+            if end < len(block):
+                rest = block[end:]
+                block = block[:end]
+            else:
+                rest = b''
+            if block:
+                self.pos += len(block)
+                yield block
+
+    def _fileinfo(self):
+        """Describes the position reached for saving it in the cookie."""
+        return dict(inode=self.stat.st_ino, pos=self.pos, head=self.head)
+
+    def _close(self):
+        self.logfile.close()
+        if self._successor:
+            self._successor.close()
+            self._successor = None
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         if not exc_type:
-            self.cookie[self.path] = dict(
-                inode=self.stat.st_ino, pos=self.logfile.tell())
+            self.cookie[self.path] = self._fileinfo()
             self.cookie.commit()
         self.cookie.close()
-        self.logfile.close()
+        self._close()
+
+
+def _open(path):
+    """Opens `path`, decompressing it if it has a known extension."""
+    opener = _decompressors.get(os.path.splitext(path)[1], open)
+    return opener(path, 'rb')
+
+
+def _fingerprint(fobj, size=HEADSIZE):
+    """Returns length and hash of the first `size` bytes of `fobj`.
+
+    The file position is reset to the start.
+    """
+    fobj.seek(0)
+    head = fobj.read(size)
+    fobj.seek(0)
+    return [len(head), hashlib.sha1(head).hexdigest()]
+
+
+class MMapLogTail(LogTail):
+    """LogTail which maps new log data into memory.
+
+    Instead of reading new data into bytes objects, the unseen region of
+    the log file is mapped read-only and offered as :class:`memoryview`
+    objects. Consumers can run :func:`re.finditer` or array parsers
+    over the views without per-line allocations. Position bookkeeping
+    is the same as with :class:`LogTail`.
+
+    .. versionadded:: 2.0
+    """
+
+    def __init__(self, path, cookie, segmentsize=1 << 30, rotated=None,
+                 max_bytes=None, max_time=None, skip_backlog=None,
+                 checkpoint_bytes=None, checkpoint_interval=None):
+        """Creates new MMapLogTail context.
+
+        :param segmentsize: map at most so many bytes at once; larger
+            regions are offered as several consecutive views
+        :param rotated: see :class:`LogTail`
+        :param max_bytes: see :class:`LogTail`; views get no larger
+            than the byte budget
+        :param max_time: see :class:`LogTail`
+        :param skip_backlog: see :class:`LogTail`
+        :param checkpoint_bytes: see :class:`LogTail`
+        :param checkpoint_interval: see :class:`LogTail`
+        """
+        super(MMapLogTail, self).__init__(
+            path, cookie, rotated=rotated, max_bytes=max_bytes,
+            max_time=max_time, skip_backlog=skip_backlog,
+            checkpoint_bytes=checkpoint_bytes,
+            checkpoint_interval=checkpoint_interval)
+        self.segmentsize = min(segmentsize, max_bytes or segmentsize)
+        self._mmap = None
+        self._view = None
+
+    def _read(self):
+        """Maps new lines into memory.
+
+        Each view contains only complete lines. An incomplete line at
+        the end of the file is held back. A view is valid until the
+        next view is requested or the context is left; copy data which
+        is needed afterwards.
+
+        :yields: memoryview objects
+        """
+        if isinstance(self.logfile, _streams):
+            # compressed rotated files cannot be mapped
+            for block in self._blocks():
+                yield memoryview(block)
+            return
+        size = self.stat.st_size
+        stop = min(self.pos + self.segmentsize, size)
+        while self.pos < size:
+            offset = self._map(stop)
+            end = self._mmap.rfind(b'\n', self.pos - offset) + 1
+            if not end:
+                # no complete line in this segment
+                self._release()
+                if stop == size:
+                    return
+                stop = min(stop + self.segmentsize, size)
+                continue
+            self._view = memoryview(self._mmap)[self.pos - offset:end]
+            self.pos = offset + end
+            yield self._view
+            self._release()
+            stop = min(self.pos + self.segmentsize, size)
+
+    def _map(self, stop):
+        """Maps the region from the current position up to `stop`.
+
+        The mapping must start at a multiple of the allocation
+        granularity, so it may include some already seen data.
+
+        :returns: file offset of the mapping
+        """
+        offset = self.pos - self.pos % mmap.ALLOCATIONGRANULARITY
+        self._mmap = mmap.mmap(self.logfile.fileno(), stop - offset,
+                               access=mmap.ACCESS_READ, offset=offset)
+        return offset
+
+    def _release(self):
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # consumer still holds slices; the mapping goes away
+                # when they are garbage collected
+                pass
+            self._mmap = None
+
+    def _close(self):
+        self._release()
+        super(MMapLogTail, self)._close()
+
+
+class MultiLogTail(object):
+    """Access new lines of many log files at once.
+
+    All log files matching a glob pattern are tracked in a single
+    cookie, which is opened and committed only once. The files are read
+    concurrently by a pool of worker threads. Data read ahead is handed
+    over through a bounded queue, so memory usage stays limited even if
+    the consumer is slow.
+
+    .. versionadded:: 2.0
+    """
+
+    def __init__(self, pattern, cookie, max_workers=4, batch='lines',
+                 blocksize=1 << 20, queuesize=16, prefilter=None):
+        """Creates new MultiLogTail context.
+
+        :param pattern: glob pattern or list of glob patterns matching
+            the log files to be observed
+        :param cookie: :class:`~.cookie.Cookie` object to save the last
+            file positions
+        :param max_workers: number of files to read concurrently
+        :param batch: see :class:`LogTail`
+        :param blocksize: see :class:`LogTail`
+        :param queuesize: maximum number of items read ahead
+        :param prefilter: see :class:`LogTail`
+        """
+        self.patterns = [pattern] if isinstance(pattern, str) else pattern
+        self.cookie = cookie
+        self.max_workers = max_workers
+        self.batch = batch
+        self.blocksize = blocksize
+        self.queuesize = queuesize
+        self.prefilter = prefilter
+        self.tails = []
+        self._fileinfo = {}
+        self._stop = threading.Event()
+        self._workers = []
+
+    def _paths(self):
+        paths = set()
+        for pattern in self.patterns:
+            paths.update(os.path.abspath(p) for p in glob.glob(pattern))
+        return sorted(paths)
+
+    def __enter__(self):
+        """Reads new lines from all matching log files.
+
+        Items from different files are interleaved in no particular
+        order, but items from the same file are yielded in order. After
+        leaving the subordinate context, the positions of all files are
+        saved in the cookie and the cookie is closed. Data which has
+        been read ahead but not consumed is offered again next time.
+
+        :yields: (path, item) tuples, where item is a line, a list of
+            lines, or a memoryview depending on `batch`
+        """
+        self.cookie.open()
+        self.tails = [LogTail(path, self.cookie, batch=self.batch,
+                              blocksize=self.blocksize,
+                              prefilter=self.prefilter)
+                      for path in self._paths()]
+        todo = queue.Queue()
+        for tail in self.tails:
+            todo.put(tail)
+        results = queue.Queue(self.queuesize)
+        self._workers = [threading.Thread(target=self._work,
+                                          args=(todo, results))
+                         for _ in range(min(self.max_workers,
+                                            len(self.tails)))]
+        for worker in self._workers:
+            worker.daemon = True
+            worker.start()
+        running = len(self._workers)
+        while running:
+            tail, item, fileinfo = results.get()
+            if tail is None:
+                running -= 1
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                self._fileinfo[tail.path] = fileinfo
+                if item is not None:
+                    yield tail.path, item
+
+    def _work(self, todo, results):
+        """Reads files from `todo` until it is empty."""
+        while not self._stop.is_set():
+            try:
+                tail = todo.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                tail.logfile = open(tail.path, 'rb')
+            except (IOError, OSError) as e:
+                # vanished since globbing
+                _log.debug('cannot open %s: %s', tail.path, e)
+                continue
+            try:
+                for item in tail._tail(self.cookie.get(tail.path, {})):
+                    if not self._put(results, (tail, item, tail._fileinfo())):
+                        return
+                self._put(results, (tail, None, tail._fileinfo()))
+            except Exception as e:
+                self._put(results, (tail, e, None))
+                return
+        self._put(results, (None, None, None))
+
+    def _put(self, results, entry):
+        """Waits for room in the queue unless the consumer has left.
+
+        :returns: False if reading should stop
+        """
+        while not self._stop.is_set():
+            try:
+                results.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._stop.set()
+        for worker in self._workers:
+            worker.join()
+        if not exc_type:
+            self.cookie.update(self._fileinfo)
+            self.cookie.commit()
+        self.cookie.close()
+        for tail in self.tails:
+            if tail.logfile:
+                tail._close()
@@ -0,0 +1,200 @@
+"""Submit check results as passive checks.
+
+Instead of printing a status line for Nagios/Icinga to pick up, check
+results may be submitted as passive check results. This is useful in
+combination with the :mod:`~nagiosplugin.batch` runner or the
+:mod:`~nagiosplugin.server`: heavy checks can be run in a single process
+and their results be handed over to the monitoring core in bulk.
+
+Results are formatted as PROCESS_SERVICE_CHECK_RESULT external commands
+and collected in a sink. When the sink is flushed, all buffered commands
+are written at once either to the external command file
+(:class:`CommandFile`) or into a new file in a spool directory
+(:class:`SpoolDirectory`).
+"""
+
+from .output import Output
+import errno
+import os
+import select
+import tempfile
+import time
+
+
+def format_command(host, service, exitcode, output, timestamp=None):
+    """Formats a PROCESS_SERVICE_CHECK_RESULT external command.
+
+    Line breaks in `output` are escaped as literal "\\n" so that long
+    output and multi-line performance data survive submission.
+
+    :param host: host name as configured in Nagios/Icinga
+    :param service: service description as configured in Nagios/Icinga
+    :param exitcode: plugin return code
+    :param output: plugin output (status line, long output, perfdata)
+    :param timestamp: check time in seconds since the epoch (default:
+        now)
+    :returns: command line including trailing newline
+    """
+    if timestamp is None:
+        timestamp = time.time()
+    output = output.rstrip('\n').replace('\\', '\\\\').replace('\n', '\\n')
+    return '[{0}] PROCESS_SERVICE_CHECK_RESULT;{1};{2};{3};{4}\n'.format(
+        int(timestamp), host, service, int(exitcode), output)
+
+
+def format_check_output(check):
+    """Compiles plugin output from an evaluated check.
+
+    The output is laid out like the output of :meth:`~.check.Check.run`
+    (status line, long output if the check is verbose, and performance
+    data), but without log messages.
+    """
+    output = Output(logchan=None, verbose=check.verbose)
+    status = output.format_status(check)
+    if check.verbose == 0:
+        perfdata = output.format_perfdata(check)
+        return status + ' ' + perfdata if perfdata else status
+    longoutput = check.verbose_str
+    if isinstance(longoutput, (list, tuple)):
+        longoutput = '\n'.join(longoutput)
+    return '\n'.join(line for line in [
+        status, longoutput, output.format_perfdata(check, 79)] if line)
+
+
+class CommandSink(object):
+    """Abstract base class for sinks of external commands.
+
+    A sink buffers external commands until it is flushed. It is not
+    meant to be used directly: subclasses like :class:`CommandFile` and
+    :class:`SpoolDirectory` must implement ``_write(data)``, which gets
+    all buffered commands as one bytes object.
+    """
+
+    def __init__(self, host):
+        """Creates sink.
+
+        :param host: default host name for submitted results
+        """
+        self.host = host
+        self.commands = []
+
+    def add(self, service, exitcode, output, host=None, timestamp=None):
+        """Adds plugin output as passive check result.
+
+        :param service: service description
+        :param exitcode: plugin return code
+        :param output: plugin output, e.g. as returned from
+            :meth:`~.check.Check.run`
+        :param host: override default host name
+        """
+        self.commands.append(format_command(
+            host or self.host, service, exitcode, output, timestamp))
+        return self
+
+    def add_check(self, check, service=None, host=None, timestamp=None):
+        """Adds result of an evaluated :class:`~.check.Check`.
+
+        :param service: service description (default: check name)
+        """
+        return self.add(service or check.name, check.exitcode,
+                        format_check_output(check), host, timestamp)
+
+    def flush(self):
+        """Writes all buffered commands and clears the buffer."""
+        if self.commands:
+            self._write(''.join(self.commands).encode('utf-8'))
+        self.commands = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if not exc_type:
+            self.flush()
+
+
+class CommandFile(CommandSink):
+    """Submits results to the external command file (named pipe).
+
+    All buffered commands are written with as few write calls as
+    possible. Writes to a pipe are only atomic up to PIPE_BUF bytes, so
+    the buffer is split at line boundaries into chunks not exceeding
+    that size. This way, commands of up to PIPE_BUF bytes (including
+    the trailing newline) cannot get interleaved with commands from
+    other processes writing to the same pipe. Longer commands, e.g.
+    verbose output with lots of performance data, must be written in
+    several parts and may get interleaved. Keep the output of checks
+    which submit through a shared command file short enough.
+    """
+
+    def __init__(self, path, host, timeout=10):
+        """Creates sink for the external command file at `path`.
+
+        :param timeout: give up if the monitoring core does not accept
+            the commands within so many seconds
+        """
+        super(CommandFile, self).__init__(host)
+        self.path = path
+        self.timeout = timeout
+
+    def _write(self, data):
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_NONBLOCK)
+        try:
+            pipe_buf = select.PIPE_BUF if hasattr(select, 'PIPE_BUF') else 512
+            deadline = time.monotonic() + self.timeout
+            for chunk in _chunks(data, pipe_buf):
+                while chunk:
+                    try:
+                        chunk = chunk[os.write(fd, chunk):]
+                    except BlockingIOError:
+                        if time.monotonic() > deadline:
+                            raise IOError(errno.ETIMEDOUT, 'command file '
+                                          'does not accept data', self.path)
+                        select.select([], [fd], [], 0.1)
+        finally:
+            os.close(fd)
+
+
+class SpoolDirectory(CommandSink):
+    """Submits results as files in a spool directory.
+
+    Each flush creates a new file containing all buffered commands. The
+    file is written under a temporary name and renamed when complete,
+    so that a consumer picking up files from the spool directory never
+    sees partially written files.
+    """
+
+    def __init__(self, path, host, suffix='.cmd'):
+        """Creates sink for the spool directory at `path`.
+
+        :param suffix: file name extension of completed spool files
+        """
+        super(SpoolDirectory, self).__init__(host)
+        self.path = path
+        self.suffix = suffix
+
+    def _write(self, data):
+        fd, tmpname = tempfile.mkstemp(dir=self.path, prefix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.chmod(tmpname, 0o644)
+            os.rename(tmpname, os.path.join(self.path, os.path.basename(
+                tmpname)[len('.tmp'):] + self.suffix))
+        except BaseException:
+            os.unlink(tmpname)
+            raise
+
+
+def _chunks(data, size):
+    """Splits `data` at line boundaries into chunks of at most `size`."""
+    start = 0
+    while start < len(data):
+        end = start + size
+        if end < len(data):
+            cut = data.rfind(b'\n', start, end)
+            end = cut + 1 if cut >= start else end
+        yield data[start:end]
+        start = end
@@ -1,9 +1,14 @@
 """Platform-specific services."""
 
+from . import thread
 import os
 
 platform = __import__('nagiosplugin.platform.{0}'.format(os.name),
-                      fromlist=['with_timeout', 'flock_exclusive'])
+                      fromlist=['with_timeout', 'flock_exclusive',
+                                'flock_shared'])
 
 with_timeout = platform.with_timeout
+with_thread_timeout = thread.with_timeout
+cancelled = thread.cancelled
 flock_exclusive = platform.flock_exclusive
+flock_shared = platform.flock_shared
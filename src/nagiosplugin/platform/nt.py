@@ -1,24 +1,28 @@
 """NT implementation of platform-specific services."""
 
-import nagiosplugin
-import threading
+from .thread import with_timeout
 import msvcrt
 
 
-def with_timeout(t, func, *args, **kwargs):
-    """Call `func` but terminate after `t` seconds.
+def flock_exclusive(fileobj, blocking=True):
+    """Acquire exclusive lock for open file `fileobj`.
 
-    We use a thread here since NT systems don't have POSIX signals.
+    :returns: False if `blocking` is False and the lock is held by
+        someone else, True otherwise
     """
+    if blocking:
+        msvcrt.locking(fileobj.fileno(), msvcrt.LK_LOCK, 2147483647)
+        return True
+    try:
+        msvcrt.locking(fileobj.fileno(), msvcrt.LK_NBLCK, 2147483647)
+    except OSError:
+        return False
+    return True
 
-    func_thread = threading.Thread(target=func, args=args, kwargs=kwargs)
-    func_thread.daemon = True  # quit interpreter even if still running
-    func_thread.start()
-    func_thread.join(t)
-    if func_thread.is_alive():
-        raise nagiosplugin.Timeout('{0}s'.format(t))
 
+def flock_shared(fileobj, blocking=True):
+    """Acquire lock for reading open file `fileobj`.
 
-def flock_exclusive(fileobj):
-    """Acquire exclusive lock for open file `fileobj`."""
-    msvcrt.locking(fileobj.fileno(), msvcrt.LK_LOCK, 2147483647)
+    There are no shared locks on NT, so the lock is exclusive.
+    """
+    return flock_exclusive(fileobj, blocking)
@@ -1,23 +1,97 @@
 """POSIX implementation of platform-specific services"""
 
+from . import thread
 import nagiosplugin
 import fcntl
+import os
 import signal
+import threading
+import time
+
+# re-arm expired timers with a tiny delay since 0 would disarm them
+_MIN_DELAY = 0.001
 
 
 def with_timeout(t, func, *args, **kwargs):
-    """Call `func` but terminate after `t` seconds."""
+    """Call `func` but terminate after `t` seconds.
+
+    `t` may be a fraction of a second. The timeout is implemented with
+    an interval timer (SIGALRM). A timer which is already running (for
+    example, from an enclosing with_timeout call) is preserved: if it
+    expires first, its signal handler is called; afterwards it is
+    re-armed with its remaining time.
+
+    Signals can only be handled in the main thread. Other threads fall
+    back to the thread-based implementation.
+
+    :raises Timeout: with the elapsed time as argument
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return thread.with_timeout(t, func, *args, **kwargs)
+    start = time.monotonic()
+    outer = dict(pending=False, fired=False)
+
     def timeout_handler(signum, frame):
-        raise nagiosplugin.Timeout('{0}s'.format(t))
+        if outer['pending']:
+            # enclosing timer has expired before ours
+            outer.update(pending=False, fired=True)
+            signal.setitimer(signal.ITIMER_REAL, max(
+                start + t - time.monotonic(), _MIN_DELAY))
+            _call_handler(old_handler, signum, frame)
+            return
+        raise nagiosplugin.Timeout(_format_elapsed(start))
 
-    signal.signal(signal.SIGALRM, timeout_handler)
-    signal.alarm(t)
+    old_handler = signal.signal(signal.SIGALRM, timeout_handler)
+    old_delay, old_interval = signal.setitimer(signal.ITIMER_REAL, t)
+    if old_delay and old_delay < t:
+        outer['pending'] = True
+        signal.setitimer(signal.ITIMER_REAL, old_delay)
     try:
         func(*args, **kwargs)
     finally:
-        signal.alarm(0)
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, old_handler)
+        if old_delay and (old_interval or not outer['fired']):
+            due = old_delay + (old_interval if outer['fired'] else 0)
+            signal.setitimer(signal.ITIMER_REAL, max(
+                due - (time.monotonic() - start), _MIN_DELAY), old_interval)
+
+
+def _call_handler(handler, signum, frame):
+    """Invokes a previously installed SIGALRM disposition."""
+    if callable(handler):
+        handler(signum, frame)
+    elif handler == signal.SIG_DFL:
+        signal.signal(signum, signal.SIG_DFL)
+        os.kill(os.getpid(), signum)
+
 
+def _format_elapsed(start):
+    return '{0}s'.format(round(time.monotonic() - start, 3))
 
-def flock_exclusive(fileobj):
-    """Acquire exclusive lock for open file `fileobj`."""
-    fcntl.flock(fileobj, fcntl.LOCK_EX)
+
+def flock_exclusive(fileobj, blocking=True):
+    """Acquire exclusive lock for open file `fileobj`.
+
+    :returns: False if `blocking` is False and the lock is held by
+        someone else, True otherwise
+    """
+    return _flock(fileobj, fcntl.LOCK_EX, blocking)
+
+
+def flock_shared(fileobj, blocking=True):
+    """Acquire shared lock for open file `fileobj`.
+
+    :returns: False if `blocking` is False and an exclusive lock is held
+        by someone else, True otherwise
+    """
+    return _flock(fileobj, fcntl.LOCK_SH, blocking)
+
+
+def _flock(fileobj, operation, blocking):
+    try:
+        fcntl.flock(fileobj, operation if blocking else
+                    operation | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return False
+    return True
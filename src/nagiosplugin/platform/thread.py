@@ -0,0 +1,58 @@
+"""Portable timeout implementation based on threads."""
+
+import contextvars
+import nagiosplugin
+import threading
+import time
+
+_cancellation = contextvars.ContextVar('nagiosplugin.cancellation',
+                                       default=None)
+
+
+def cancelled():
+    """Tells if the current function has been abandoned after a timeout.
+
+    Threads cannot be interrupted from the outside. Long-running code
+    executed under :func:`with_timeout` may poll this function and stop
+    working once the timeout has expired.
+
+    :returns: True if a timeout has expired for the current function
+    """
+    event = _cancellation.get()
+    return event is not None and event.is_set()
+
+
+def with_timeout(t, func, *args, **kwargs):
+    """Call `func` but terminate after `t` seconds.
+
+    `func` runs in a separate thread (within a copy of the current
+    context) while the calling thread waits for it. This works without
+    POSIX signals and from any thread, but a function that runs over
+    time cannot be stopped. It is left running in the background and
+    :func:`cancelled` returns True within its context from then on.
+    Exceptions raised by `func` are re-raised in the calling thread.
+
+    :raises Timeout: with the elapsed time as argument
+    """
+    start = time.monotonic()
+    context = contextvars.copy_context()
+    cancellation = threading.Event()
+    context.run(_cancellation.set, cancellation)
+    outcome = []
+
+    def target():
+        try:
+            context.run(func, *args, **kwargs)
+        except BaseException as e:
+            outcome.append(e)
+
+    func_thread = threading.Thread(target=target)
+    func_thread.daemon = True  # quit interpreter even if still running
+    func_thread.start()
+    func_thread.join(t)
+    if func_thread.is_alive():
+        cancellation.set()
+        raise nagiosplugin.Timeout('{0}s'.format(
+            round(time.monotonic() - start, 3)))
+    if outcome:
+        raise outcome[0]
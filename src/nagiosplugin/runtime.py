@@ -3,17 +3,37 @@
 This module contains the :class:`Runtime` class that handles exceptions,
 timeouts and logging. Plugin authors should not use Runtime directly,
 but decorate the plugin's main function with :func:`~.runtime.guarded`.
+
+Each thread and each asyncio task has its own current runtime, so that
+several checks may be executed in parallel within one process without
+mixing up their outputs and log messages.
 """
 
 from .output import Output
 from .error import Timeout
-from .platform import with_timeout
+from .platform import with_timeout, with_thread_timeout
+import contextvars
 import io
 import logging
 import sys
 import functools
+import time
 import traceback
 
+_current = contextvars.ContextVar('nagiosplugin.runtime', default=None)
+
+
+class _LogDispatcher(logging.Handler):
+    """Routes log records to the log channel of the current runtime."""
+
+    def emit(self, record):
+        runtime = _current.get()
+        if runtime is not None and record.levelno >= runtime.logchan.level:
+            runtime.logchan.handle(record)
+
+
+_dispatcher = _LogDispatcher()
+
 
 def guarded(func):
     """Runs a function in a newly created runtime environment.
@@ -40,31 +60,54 @@ def guarded(func):
 
 
 class Runtime(object):
-    """Singleton which handles output, logging and exceptions."""
+    """Handles output, logging and exceptions.
+
+    Instantiating Runtime returns the runtime which is bound to the
+    current thread or asyncio task. A new runtime is created and bound
+    if there is none yet or if the bound runtime is busy executing
+    another check. Output and captured log messages are reset for
+    each check execution.
+
+    .. versionchanged:: 2.0
+       Runtime is no longer a process-wide singleton.
+    """
 
-    instance = None
     check = None
     logchan = None
     output = None
+    executing = False
     exitcode = 70  # EX_SOFTWARE
     sysexit = sys.exit
 
     def __new__(cls):
-        if not cls.instance:
-            cls.instance = super(Runtime, cls).__new__(cls)
-        return cls.instance
+        runtime = _current.get()
+        if runtime is None or runtime.executing:
+            runtime = super(Runtime, cls).__new__(cls)
+            _current.set(runtime)
+        return runtime
 
     def __init__(self):
         rootlogger = logging.getLogger(__name__.split('.', 1)[0])
         rootlogger.setLevel(logging.DEBUG)
+        if _dispatcher not in rootlogger.handlers:
+            rootlogger.addHandler(_dispatcher)
         if not self.logchan:
-            self.logchan = logging.StreamHandler(io.StringIO())
-            self.logchan.setFormatter(logging.Formatter('%(message)s'))
-            rootlogger.addHandler(self.logchan)
-        if not self.output:
-            self.output = Output(self.logchan)
+            self._reset()
+
+    def _reset(self):
+        """Starts over with empty output and log capture."""
+        self.logchan = logging.StreamHandler(io.StringIO())
+        self.logchan.setFormatter(logging.Formatter('%(message)s'))
+        self.output = Output(self.logchan)
+        self.exitcode = Runtime.exitcode
 
     def _handle_exception(self, statusline=None):
+        self._report_exception(statusline)
+        print(self.output, end='')
+        self.sysexit(3)
+
+    def _report_exception(self, statusline=None):
+        """Puts the exception currently being handled into the output."""
         exc_type, value = sys.exc_info()[0:2]
         name = self.check.name.upper() + ' ' if self.check else ''
         self.output.status = '{0}UNKNOWN: {1}'.format(
@@ -72,8 +115,7 @@ class Runtime(object):
                 exc_type, value)[0].strip())
         if not self.check or self.check.verbose > 0:
             self.output.add_longoutput(traceback.format_exc())
-        print(self.output, end='')
-        self.sysexit(3)
+        self.exitcode = 3
 
     def _configure_verbosity(self, verbose):
         if verbose >= 3:
@@ -96,10 +138,69 @@ class Runtime(object):
         :param timeout: aborts execution after `timeout` seconds
         :return: tuple (output, exitcode)
         """
+        if getattr(check, 'is_async', False):
+            # imported on demand to keep start-up of synchronous
+            # plugins fast
+            import asyncio
+            return asyncio.run(self.execute_async(check))
+        self._begin(check)
+        try:
+            if check.timeout > 0:
+                self._timeout_function(check)(check.timeout, self.run)
+            else:
+                self.run()
+        except Timeout:
+            # With thread-based timeouts, the abandoned run goes on in
+            # the background and still refers to this runtime. Leave it
+            # marked as executing so that the next check gets a new one.
+            raise
+        except BaseException:
+            self.executing = False
+            raise
+        self.executing = False
+        return str(self.output), self.exitcode
+
+    @staticmethod
+    def _timeout_function(check):
+        method = getattr(check, 'timeout_method', 'auto')
+        if method == 'auto':
+            return with_timeout
+        elif method == 'thread':
+            return with_thread_timeout
+        raise ValueError('unknown timeout method', method)
+
+    def _begin(self, check):
+        if self.check is not None:
+            self._reset()
         self.check = check
+        self.executing = True
         self._configure_verbosity(check.verbose)
-        if check.timeout > 0:
-            with_timeout(check.timeout, self.run)
-        else:
-            self.run()
+
+    async def run_async(self):
+        await self.check.acall()
+        self.output.add(self.check)
+        self.exitcode = self.check.exitcode
+
+    async def execute_async(self, check):
+        """Execute `check` on the running event loop.
+
+        The timeout is enforced by cancelling the check's pending
+        coroutines instead of interrupting it with a signal.
+
+        :return: tuple (output, exitcode)
+        """
+        import asyncio
+        self._begin(check)
+        start = time.monotonic()
+        try:
+            if check.timeout > 0:
+                try:
+                    await asyncio.wait_for(self.run_async(), check.timeout)
+                except asyncio.TimeoutError:
+                    raise Timeout('{0}s'.format(
+                        round(time.monotonic() - start, 3)))
+            else:
+                await self.run_async()
+        finally:
+            self.executing = False
         return str(self.output), self.exitcode
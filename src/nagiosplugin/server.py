@@ -0,0 +1,165 @@
+"""Serve plugin invocations from a long-running interpreter.
+
+Starting a Python interpreter and importing nagiosplugin (and possibly
+heavy libraries like numpy) often costs more than the check itself.
+:class:`CheckServer` imports a set of plugin main functions once and then
+executes invocations requested over a UNIX domain socket. The thin
+client :func:`call` sends the plugin's name and command line arguments
+and receives the same output and exit code that the plugin would have
+produced when started on its own. The client is implemented in the
+standalone :mod:`nagiosplugin_client` module, which does not import the
+nagiosplugin package.
+
+Each request is handled in a process forked from the warm server
+process. Thus concurrent requests are fully isolated from each other:
+the :class:`~.runtime.Runtime`, captured log output and SIGALRM-based
+timeouts belong to the request's own process.
+
+Start a server and invoke a check from the command line::
+
+    python -m nagiosplugin.server serve /run/nagiosplugin.sock \\
+        load=nagiosplugin.examples.check_load:main
+    python -m nagiosplugin_client /run/nagiosplugin.sock load -w 1
+"""
+
+from nagiosplugin_client import call
+import contextlib
+import contextvars
+import importlib
+import io
+import json
+import os
+import socketserver
+import sys
+import threading
+
+
+def resolve(spec):
+    """Imports `spec` given as "module:callable" string."""
+    if callable(spec):
+        return spec
+    module, _, name = spec.partition(':')
+    obj = importlib.import_module(module)
+    for attr in name.split('.'):
+        obj = getattr(obj, attr)
+    return obj
+
+
+def invoke(func, argv):
+    """Runs a plugin main function as if started as separate process.
+
+    :param func: plugin main function which prints the plugin output and
+        calls :func:`sys.exit` (like :meth:`~.check.Check.main`)
+    :param argv: command line, including the program name
+    :return: (output, exitcode) tuple
+    """
+    stdout = io.StringIO()
+    saved_argv = sys.argv
+    sys.argv = list(argv)
+    try:
+        with contextlib.redirect_stdout(stdout):
+            # empty context: start with a fresh runtime
+            contextvars.Context().run(func)
+        exitcode = 0
+    except SystemExit as e:
+        exitcode = e.code if isinstance(e.code, int) else (
+            0 if e.code is None else 3)
+    finally:
+        sys.argv = saved_argv
+    return stdout.getvalue(), exitcode
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        self.lock = threading.Lock()
+        self.responded = False
+        if self.server.request_timeout:
+            watchdog = threading.Timer(
+                self.server.request_timeout, self.abort)
+            watchdog.daemon = True
+            watchdog.start()
+        try:
+            request = json.loads(self.rfile.readline().decode('utf-8'))
+            name = request['check']
+            argv = [name] + list(request.get('argv', []))
+        except (ValueError, KeyError, TypeError) as e:
+            self.respond('UNKNOWN: malformed request: {0}\n'.format(e), 3)
+            return
+        try:
+            func = self.server.checks[name]
+        except KeyError:
+            self.respond('UNKNOWN: unknown check {0}\n'.format(name), 3)
+            return
+        self.respond(*invoke(func, argv))
+
+    def respond(self, output, exitcode):
+        with self.lock:
+            if self.responded:
+                return
+            self.responded = True
+            self.wfile.write(json.dumps(dict(
+                output=output, exitcode=exitcode)).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+    def abort(self):
+        """Terminates a request that exceeds the server's time limit."""
+        self.respond('UNKNOWN: request aborted after {0}s\n'.format(
+            self.server.request_timeout), 3)
+        os._exit(3)
+
+
+class CheckServer(socketserver.ForkingMixIn, socketserver.UnixStreamServer):
+    """Executes preloaded plugins on request.
+
+    The server forks a new process for each request, so plugins run
+    exactly as they would in a freshly started interpreter, but without
+    the start-up cost.
+    """
+
+    def __init__(self, path, checks, request_timeout=None):
+        """Creates server listening on UNIX domain socket `path`.
+
+        :param path: socket file name; a stale socket file is replaced
+        :param checks: dict mapping check names to plugin main functions
+            (or "module:callable" strings which are imported right away)
+        :param request_timeout: kill requests that take longer than so
+            many seconds (in addition to the plugin's own timeout)
+        """
+        self.checks = dict((name, resolve(spec))
+                           for name, spec in checks.items())
+        self.request_timeout = request_timeout
+        if os.path.exists(path):
+            os.unlink(path)
+        socketserver.UnixStreamServer.__init__(self, path, _RequestHandler)
+
+    def server_close(self):
+        super(CheckServer, self).server_close()
+        with contextlib.suppress(OSError):
+            os.unlink(self.server_address)
+
+
+def main(argv=None):  # pragma: no cover
+    """Command line interface to run a server or a client."""
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) >= 3 and argv[0] == 'serve':
+        checks = dict(arg.split('=', 1) for arg in argv[2:])
+        server = CheckServer(argv[1], checks)
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+    elif len(argv) >= 3 and argv[0] == 'call':
+        output, exitcode = call(argv[1], argv[2], argv[3:])
+        print(output, end='')
+        sys.exit(exitcode)
+    else:
+        print('usage: python -m nagiosplugin.server serve SOCKET '
+              'NAME=MODULE:CALLABLE...\n'
+              '       python -m nagiosplugin_client SOCKET NAME [ARG...]',
+              file=sys.stderr)
+        sys.exit(3)
+
+
+if __name__ == '__main__':  # pragma: no cover
+    main()
@@ -0,0 +1,127 @@
+from nagiosplugin.batch import Definition, execute, parse_definitions, \
+    run_batch, parse_args
+import io
+import logging
+import nagiosplugin
+import time
+import unittest
+
+
+class Value(nagiosplugin.Resource):
+
+    def __init__(self, name, value, delay=0):
+        self._name = name
+        self.value = value
+        self.delay = delay
+
+    @property
+    def name(self):
+        return self._name
+
+    def probe(self):
+        logging.getLogger('nagiosplugin').warning('probing %s', self._name)
+        time.sleep(self.delay)
+        return nagiosplugin.Metric(self._name, self.value, context='value')
+
+
+def value_check(name, value, critical='', delay=0):
+    return nagiosplugin.Check(
+        Value(name, int(value), float(delay)),
+        nagiosplugin.ScalarContext('value', critical=critical))
+
+
+def broken_check():
+    raise RuntimeError('cannot create check')
+
+
+def not_a_check():
+    return object()
+
+
+class DefinitionTest(unittest.TestCase):
+
+    def test_parse(self):
+        d = Definition.parse('foo os.path:join "a b" c')
+        self.assertEqual('foo', d.name)
+        self.assertEqual('os.path:join', d.factory)
+        self.assertEqual(['a b', 'c'], d.args)
+
+    def test_parse_definitions_skips_comments_and_blanks(self):
+        defs = list(parse_definitions(io.StringIO(
+            '# comment\n\na mod:f\n  b mod:g 1\n')))
+        self.assertEqual(['a', 'b'], [d.name for d in defs])
+
+    def test_create_rejects_non_check(self):
+        d = Definition('x', not_a_check)
+        with self.assertRaises(TypeError):
+            d.create()
+
+
+class ExecuteTest(unittest.TestCase):
+
+    def test_record(self):
+        record = execute(Definition(
+            'a', 'nagiosplugin.tests.test_batch:value_check', ['a', '3']),
+            verbose=0)
+        self.assertEqual(dict(
+            name='a', status='A OK - a is 3', perfdata=['a=3'],
+            output='A OK - a is 3 | a=3\nprobing a\n', exitcode=0), record)
+
+    def test_critical(self):
+        record = execute(Definition('b', value_check, ['b', '3', '2']), 0)
+        self.assertEqual(2, record['exitcode'])
+        self.assertEqual('B CRITICAL - b is 3',
+                         record['status'])
+
+    def test_exception_is_reported_as_unknown(self):
+        record = execute(Definition('broken', broken_check), 0)
+        self.assertEqual(3, record['exitcode'])
+        self.assertEqual('UNKNOWN: RuntimeError: cannot create check',
+                         record['status'])
+        self.assertEqual([], record['perfdata'])
+
+    def test_timeout_is_reported_as_unknown(self):
+        record = execute(Definition('slow', value_check,
+                                    ['slow', '1', '', '3']), 0, 1)
+        self.assertEqual(3, record['exitcode'])
+        self.assertRegex(
+            record['status'], r'^SLOW UNKNOWN: Timeout: check execution '
+            r'aborted after 1(\.\d+)?s$')
+
+
+class RunBatchTest(unittest.TestCase):
+
+    definitions = [Definition(str(i), value_check, [str(i), i, '', 0.2])
+                   for i in range(6)]
+
+    def test_sequential(self):
+        records = list(run_batch(self.definitions[:2], verbose=1))
+        self.assertEqual(['0', '1'], [r['name'] for r in records])
+
+    def test_parallel(self):
+        start = time.time()
+        records = list(run_batch(self.definitions, max_workers=6, verbose=1))
+        self.assertLess(time.time() - start, 1.0)
+        self.assertEqual(set(str(i) for i in range(6)),
+                         set(r['name'] for r in records))
+        for record in records:
+            # log messages of other checks don't leak into the output
+            self.assertEqual(['probing ' + record['name']], [
+                line for line in record['output'].splitlines()
+                if line.startswith('probing')])
+
+    def test_parallel_timeout_in_worker_thread(self):
+        records = list(run_batch([
+            Definition('slow', value_check, ['slow', '1', '', '3']),
+            Definition('fast', value_check, ['fast', '1'])],
+            max_workers=2, verbose=0, timeout=1))
+        by_name = dict((r['name'], r) for r in records)
+        self.assertEqual(0, by_name['fast']['exitcode'])
+        self.assertEqual(3, by_name['slow']['exitcode'])
+
+
+def test_parse_args():
+    args = parse_args(['-j', '4', '-t', '2.5', '-vv', '-'])
+    assert 4 == args.jobs
+    assert 2.5 == args.timeout
+    assert 2 == args.verbose
@@ -1,5 +1,13 @@
 from nagiosplugin.check import Check
 import nagiosplugin
+import asyncio
+import logging
+import os
+import pytest
+import subprocess
+import sys
+import threading
+import time
 import unittest
 
 
@@ -159,3 +167,354 @@ def test_default_verbose_and_timeout():
     c.run()
     assert 0 == c.verbose
     assert 5 == c.timeout
+
+
+class R5_Slow(nagiosplugin.Resource):
+
+    def __init__(self, name, delay, barrier=None):
+        self._name = name
+        self.delay = delay
+        self.barrier = barrier
+
+    @property
+    def name(self):
+        return self._name
+
+    def probe(self):
+        if self.barrier:
+            self.barrier.wait(5)
+        time.sleep(self.delay)
+        yield nagiosplugin.Metric(self._name, self.delay, context='default')
+
+
+def run_plugin(source):
+    """Runs plugin `source` in a fresh interpreter.
+
+    :returns: (output, seconds until the interpreter has exited)
+    """
+    start = time.monotonic()
+    proc = subprocess.run(
+        [sys.executable, '-c', source], stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE, env={'PYTHONPATH': ':'.join(sys.path)},
+        timeout=30)
+    return proc.stdout.decode(), time.monotonic() - start
+
+
+class R6_FaultyAfterMetric(nagiosplugin.Resource):
+
+    def probe(self):
+        yield nagiosplugin.Metric('before', 1, context='default')
+        raise nagiosplugin.CheckError('broken')
+
+
+class ConcurrentCheckTest(unittest.TestCase):
+
+    def test_max_workers_constructor_argument(self):
+        self.assertEqual(4, Check(max_workers=4).max_workers)
+        self.assertIsNone(Check().max_workers)
+
+    def test_probes_run_concurrently(self):
+        barrier = threading.Barrier(3)
+        c = Check(*[R5_Slow('r{0}'.format(i), 0, barrier)
+                    for i in range(3)], max_workers=3)
+        c()
+        self.assertEqual(['r0', 'r1', 'r2'],
+                         [res.metric.name for res in c.results])
+
+    def test_same_outcome_as_sequential_mode(self):
+        def make_check(**kw):
+            return Check(R5_Slow('b', 0.03), R6_FaultyAfterMetric(),
+                         R1_MetricDefaultContext(), R5_Slow('a', 0), **kw)
+
+        sequential = make_check()
+        sequential()
+        concurrent = make_check(max_workers=4)
+        concurrent()
+        self.assertEqual([(str(r.state), str(r)) for r in sequential.results],
+                         [(str(r.state), str(r)) for r in concurrent.results])
+        self.assertEqual(sequential.perfdata, concurrent.perfdata)
+        self.assertEqual(sequential.exitcode, concurrent.exitcode)
+
+    def test_checkerror_result_refers_to_last_metric(self):
+        c = Check(R6_FaultyAfterMetric(), R1_MetricDefaultContext(),
+                  max_workers=2)
+        c()
+        unknown = c.results.most_significant[0]
+        self.assertEqual('broken', unknown.hint)
+        self.assertEqual('before', unknown.metric.name)
+
+    def test_warns_about_resource_without_metrics(self):
+        c = Check(nagiosplugin.Resource(), R1_MetricDefaultContext(),
+                  max_workers=2)
+        with self.assertLogs('nagiosplugin', 'WARNING'):
+            c()
+
+    def test_timeout_does_not_wait_for_running_probes(self):
+        c = Check(R5_Slow('a', 2), R5_Slow('b', 2), max_workers=2)
+        start = time.monotonic()
+        with self.assertRaises(nagiosplugin.Timeout):
+            c.run(timeout=0.3)
+        self.assertLess(time.monotonic() - start, 1.5)
+
+    def test_plugin_exits_after_timeout(self):
+        output, elapsed = run_plugin("""\
+import nagiosplugin, time
+class Slow(nagiosplugin.Resource):
+    def probe(self):
+        time.sleep(4)
+        return []
+@nagiosplugin.guarded
+def main():
+    nagiosplugin.Check(Slow(), Slow(), max_workers=2).main(timeout=0.5)
+main()
+""")
+        self.assertIn('Timeout', output)
+        self.assertLess(elapsed, 3)
+
+    def test_worker_log_messages_appear_in_output(self):
+        class R_Logging(nagiosplugin.Resource):
+            def probe(self):
+                logging.getLogger('nagiosplugin').warning('from worker')
+                return nagiosplugin.Metric('foo', 1, context='default')
+
+        c = Check(R_Logging(), R1_MetricDefaultContext(), max_workers=2)
+        output, _ = c.run(1, 0)
+        self.assertIn('\nfrom worker\n', output)
+
+
+class R7_Coroutine(nagiosplugin.Resource):
+
+    def __init__(self, name, delay=0):
+        self._name = name
+        self.delay = delay
+        self.cancelled = False
+
+    @property
+    def name(self):
+        return self._name
+
+    async def probe(self):
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        return nagiosplugin.Metric(self._name, 1, context='default')
+
+
+class R8_AsyncGenerator(nagiosplugin.Resource):
+
+    async def probe(self):
+        yield nagiosplugin.Metric('gen1', 1, context='default')
+        await asyncio.sleep(0)
+        yield nagiosplugin.Metric('gen2', 2, context='default')
+        raise nagiosplugin.CheckError('gen failed')
+
+
+class AsyncCheckTest(unittest.TestCase):
+
+    def test_is_async(self):
+        self.assertFalse(Check(R1_MetricDefaultContext()).is_async)
+        self.assertTrue(Check(R1_MetricDefaultContext(),
+                              R7_Coroutine('c')).is_async)
+
+    def test_call_drives_async_probes_on_event_loop(self):
+        c = Check(R7_Coroutine('c1', 0.02), R1_MetricDefaultContext(),
+                  R8_AsyncGenerator())
+        c()
+        self.assertEqual(['c1=1', 'foo=1', 'gen1=1', 'gen2=2'], c.perfdata)
+        self.assertEqual('gen failed', c.results.most_significant[0].hint)
+        self.assertEqual('gen2', c.results.most_significant[0].metric.name)
+
+    def test_probes_run_concurrently(self):
+        c = Check(*[R7_Coroutine('c{0}'.format(i), 0.2) for i in range(10)])
+        start = time.time()
+        c()
+        self.assertLess(time.time() - start, 1.0)
+        self.assertEqual(10, len(c.results))
+
+    def test_arun(self):
+        c = Check(R7_Coroutine('c1'), R1_MetricDefaultContext())
+        output, exitcode = asyncio.run(c.arun(0, 5))
+        self.assertEqual('C1 OK - c1 is 1 | c1=1 foo=1\n', output)
+        self.assertEqual(0, exitcode)
+
+    def test_arun_timeout_cancels_pending_probes(self):
+        slow = R7_Coroutine('slow', 10)
+        c = Check(slow)
+        with self.assertRaises(nagiosplugin.Timeout):
+            asyncio.run(c.arun(timeout=1))
+        self.assertTrue(slow.cancelled)
+
+    def test_run_uses_event_loop_timeout(self):
+        slow = R7_Coroutine('slow', 10)
+        c = Check(slow)
+        with self.assertRaises(nagiosplugin.Timeout):
+            c.run(timeout=1)
+        self.assertTrue(slow.cancelled)
+
+    def test_plugin_with_hung_sync_probe_exits_after_timeout(self):
+        output, elapsed = run_plugin("""\
+import asyncio, nagiosplugin, time
+class Async(nagiosplugin.Resource):
+    async def probe(self):
+        await asyncio.sleep(0)
+        return []
+class Sync(nagiosplugin.Resource):
+    def probe(self):
+        time.sleep(4)
+        return []
+@nagiosplugin.guarded
+def main():
+    nagiosplugin.Check(Async(), Sync()).main(timeout=0.5)
+main()
+""")
+        self.assertIn('Timeout', output)
+        self.assertLess(elapsed, 3)
+
+    def test_import_does_not_load_asyncio(self):
+        output, _ = run_plugin(
+            'import sys, nagiosplugin; print("asyncio" in sys.modules)')
+        self.assertEqual('False\n', output)
+
+
+class R9_Pid(nagiosplugin.Resource):
+
+    def probe(self):
+        yield nagiosplugin.Metric('pid', os.getpid(), context='null')
+        yield nagiosplugin.Metric('answer', 42, context='default')
+
+
+class ProcessPoolCheckTest(unittest.TestCase):
+
+    def test_probes_in_worker_processes(self):
+        c = Check(R9_Pid(), R6_FaultyAfterMetric(), max_workers=2,
+                  executor='process')
+        c()
+        self.assertNotEqual(os.getpid(), c.results['pid'].metric.value)
+        self.assertEqual(['answer=42', 'before=1'], c.perfdata)
+        self.assertEqual('broken', c.results.most_significant[0].hint)
+
+    def test_metrics_get_rebound_in_parent(self):
+        resource = R9_Pid()
+        c = Check(resource, R1_MetricDefaultContext(), max_workers=2,
+                  executor='process')
+        c()
+        self.assertIs(resource, c.results['answer'].resource)
+        self.assertIs(c.contexts['default'], c.results['answer'].context)
+
+    def test_unknown_executor(self):
+        c = Check(R9_Pid(), R1_MetricDefaultContext(), max_workers=2,
+                  executor='fiber')
+        with self.assertRaises(ValueError):
+            c()
+
+
+class DeadlineCheckTest(unittest.TestCase):
+
+    def test_overrunning_resource_yields_unknown(self):
+        c = Check(R5_Slow('fast', 0), R5_Slow('slow', 2),
+                  R1_MetricDefaultContext(), resource_timeout=0.2)
+        start = time.time()
+        with self.assertLogs('nagiosplugin', 'WARNING'):
+            c()
+        self.assertLess(time.time() - start, 1.5)
+        self.assertEqual(['fast=0', 'foo=1'], c.perfdata)
+        self.assertEqual(nagiosplugin.Unknown, c.state)
+        self.assertEqual('slow: timeout after 0.2s',
+                         c.results.most_significant[0].hint)
+
+    def test_budget_is_per_resource(self):
+        c = Check(*[R5_Slow('r{0}'.format(i), 0.1) for i in range(4)],
+                  resource_timeout=0.5)
+        c()
+        self.assertEqual(nagiosplugin.Ok, c.state)
+        self.assertEqual(4, len(c.results))
+
+    def test_overrun_frees_worker_for_remaining_resources(self):
+        c = Check(R5_Slow('slow', 2), R5_Slow('fast', 0),
+                  resource_timeout=0.2, max_workers=1)
+        c()
+        self.assertIn('fast', c.results)
+        self.assertEqual(['fast=0'], c.perfdata)
+
+    def test_probe_exception_propagates(self):
+        class R_Broken(nagiosplugin.Resource):
+            def probe(self):
+                raise ValueError('broken probe')
+
+        c = Check(R_Broken(), R1_MetricDefaultContext(),
+                  resource_timeout=5)
+        start = time.monotonic()
+        with self.assertRaisesRegex(ValueError, 'broken probe'):
+            c()
+        self.assertLess(time.monotonic() - start, 1)
+
+    def test_async_probe_gets_cancelled(self):
+        slow = R7_Coroutine('slow', 10)
+        c = Check(slow, R7_Coroutine('fast'), resource_timeout=0.2)
+        c()
+        self.assertTrue(slow.cancelled)
+        self.assertEqual(['fast=1'], c.perfdata)
+        self.assertEqual('slow: timeout after 0.2s',
+                         c.results.most_significant[0].hint)
+
+    def test_requires_thread_executor(self):
+        c = Check(R5_Slow('r', 0), executor='process', resource_timeout=1)
+        with self.assertRaises(ValueError):
+            c()
+
+
+def test_subsecond_timeout_is_kept():
+    c = Check(R5_Slow('slow', 2))
+    with pytest.raises(nagiosplugin.Timeout):
+        c.run(timeout=0.3)
+    assert 0.3 == c.timeout
+
+
+class TimeoutMethodTest(unittest.TestCase):
+
+    def test_thread_timeout_stops_at_next_resource(self):
+        slow = R5_Slow('slow', 0.3)
+        probed = []
+
+        class R_Record(nagiosplugin.Resource):
+            def probe(self):
+                probed.append(True)
+                return []
+
+        c = Check(slow, R_Record(), timeout_method='thread')
+        with self.assertRaises(nagiosplugin.Timeout):
+            c.run(timeout=0.1)
+        time.sleep(0.4)
+        self.assertEqual([], probed)
+
+    def test_abandoned_run_does_not_touch_next_check(self):
+        c = Check(R5_Slow('first', 0.5), timeout_method='thread')
+        with self.assertRaises(nagiosplugin.Timeout):
+            c.run(timeout=0.2)
+        c = Check(R5_Slow('fast', 0), R5_Slow('slow', 1),
+                  timeout_method='thread')
+        output, _ = c.run(0, 3)
+        self.assertEqual('FAST OK - fast is 0 | fast=0 slow=1\n', output)
+
+    def test_thread_timeout_from_worker_threads(self):
+        outcomes = []
+
+        def run():
+            c = Check(R5_Slow('slow', 1), timeout_method='thread')
+            try:
+                c.run(timeout=0.1)
+            except nagiosplugin.Timeout:
+                outcomes.append('timeout')
+
+        threads = [threading.Thread(target=run) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(['timeout'] * 4, outcomes)
+
+    def test_unknown_timeout_method(self):
+        with self.assertRaises(ValueError):
+            Check(timeout_method='magic').run(timeout=1)
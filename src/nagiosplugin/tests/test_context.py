@@ -1,6 +1,10 @@
-from nagiosplugin.context import Context, ScalarContext, Contexts
+from nagiosplugin.context import Context, ScalarContext, RateContext
+from nagiosplugin.context import Contexts
+from nagiosplugin.tests.util import TempDirTestCase
 import nagiosplugin
+import os
 import unittest
+from unittest import mock
 
 
 class ContextTest(unittest.TestCase):
@@ -50,6 +54,112 @@ class ScalarContextTest(unittest.TestCase):
         self.assertEqual(nagiosplugin.Range(), c.critical)
 
 
+class RateContextTest(TempDirTestCase):
+
+    prefix = 'ratecontext_'
+
+    def setUp(self):
+        super(RateContextTest, self).setUp()
+        self.statefile = os.path.join(self.dir, 'state')
+        self.cookie = nagiosplugin.Cookie(self.statefile)
+
+    def tearDown(self):
+        self.cookie.close()
+        super(RateContextTest, self).tearDown()
+
+    def evaluate(self, ctx, value, now, name='bytes'):
+        m = nagiosplugin.Metric(name, value, context=ctx.name)
+        with mock.patch('time.time', return_value=now):
+            result = ctx.evaluate(m, None)
+            perf = ctx.performance(m, None)
+        return result, perf
+
+    def test_first_sample_has_no_rate(self):
+        ctx = RateContext('bytes', self.cookie, '0:10')
+        result, perf = self.evaluate(ctx, 100, 1000)
+        ctx.close()
+        self.assertEqual(nagiosplugin.Ok, result.state)
+        self.assertEqual('bytes rate unknown (first sample)', result.hint)
+        self.assertIsNone(perf)
+        with nagiosplugin.Cookie(self.statefile) as cookie:
+            self.assertEqual([100, 1000], cookie['bytes'])
+
+    def test_rate_per_second(self):
+        ctx = RateContext('bytes', self.cookie, '0:10', '0:20')
+        self.evaluate(ctx, 100, 1000)
+        ctx.close()
+        result, perf = self.evaluate(ctx, 250, 1010)
+        ctx.close()
+        self.assertEqual(nagiosplugin.Warn, result.state)
+        self.assertEqual(15, result.metric.value)
+        self.assertEqual('bytes is 15/s', result.hint)
+        self.assertEqual('bytes=15.0;10;20', str(perf))
+
+    def test_counter_reset(self):
+        ctx = RateContext('bytes', self.cookie, '0:10')
+        self.evaluate(ctx, 100, 1000)
+        ctx.close()
+        result, perf = self.evaluate(ctx, 10, 1010)
+        ctx.close()
+        self.assertEqual('bytes rate unknown (counter reset)', result.hint)
+        self.assertIsNone(perf)
+        result, _ = self.evaluate(ctx, 30, 1020)
+        ctx.close()
+        self.assertEqual(2, result.metric.value)
+
+    def test_wraparound(self):
+        ctx = RateContext('bytes', self.cookie, wrap=2 ** 32)
+        self.evaluate(ctx, 2 ** 32 - 100, 1000)
+        ctx.close()
+        result, _ = self.evaluate(ctx, 100, 1010)
+        ctx.close()
+        self.assertEqual(20, result.metric.value)
+
+    def test_no_time_elapsed(self):
+        ctx = RateContext('bytes', self.cookie)
+        self.evaluate(ctx, 100, 1000)
+        ctx.close()
+        result, _ = self.evaluate(ctx, 200, 1000)
+        self.assertEqual('bytes rate unknown (no time elapsed)', result.hint)
+
+    def test_leaves_cookie_opened_by_caller_alone(self):
+        ctx = RateContext('bytes', self.cookie)
+        with self.cookie:
+            self.evaluate(ctx, 100, 1000)
+            ctx.close()
+            self.assertFalse(self.cookie.closed)
+            self.assertEqual([100, 1000], self.cookie['bytes'])
+
+    def test_check_opens_shared_cookie_once(self):
+        class Counters(nagiosplugin.Resource):
+            def probe(self):
+                yield nagiosplugin.Metric('rx', self.rx, context='rx')
+                yield nagiosplugin.Metric('tx', self.tx, context='tx')
+
+        def run(rx, tx, now):
+            resource = Counters()
+            resource.rx, resource.tx = rx, tx
+            check = nagiosplugin.Check(
+                resource, RateContext('rx', self.cookie, '0:5'),
+                RateContext('tx', self.cookie, '0:5'))
+            with mock.patch('time.time', return_value=now):
+                check()
+            return check
+
+        run(0, 0, 1000)
+        with mock.patch.object(self.cookie, 'open',
+                               wraps=self.cookie.open) as open_, \
+                mock.patch.object(self.cookie, 'commit',
+                                  wraps=self.cookie.commit) as commit:
+            check = run(20, 100, 1010)
+        self.assertEqual(1, open_.call_count)
+        self.assertEqual(1, commit.call_count)
+        self.assertTrue(self.cookie.closed)
+        self.assertEqual(nagiosplugin.Warn, check.state)
+        self.assertEqual(['rx=2.0;5', 'tx=10.0;5'],
+                         sorted(check.perfdata))
+
+
 class ContextsTest(unittest.TestCase):
 
     def test_keyerror(self):
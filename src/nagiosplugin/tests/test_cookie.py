@@ -1,10 +1,16 @@
 # vim: set fileencoding=utf-8 :
 from __future__ import unicode_literals, print_function
-from nagiosplugin.cookie import Cookie
+from nagiosplugin.cookie import Cookie, SQLiteCookie
+from nagiosplugin.error import CheckError
+from nagiosplugin.tests.util import TempDirTestCase
 import codecs
 import os
+import sqlite3
+import stat
 import tempfile
+import threading
 import unittest
+from unittest import mock
 
 
 class CookieTest(unittest.TestCase):
@@ -108,3 +114,327 @@ class CookieTest(unittest.TestCase):
         c.commit()
         c.close()
         self.assertEqual(c['key'], 1)
+
+    def test_unchanged_cookie_is_not_rewritten(self):
+        with open(self.tf.name, 'w') as f:
+            f.write('{"key": 1}\n')
+        os.utime(self.tf.name, (0, 0))
+        with Cookie(self.tf.name) as c:
+            c['key'] = 1
+        self.assertEqual(0, os.stat(self.tf.name).st_mtime)
+
+
+class CookieTestCase(TempDirTestCase):
+    """Provides the name of a (not yet existing) state file :attr:`path`."""
+
+    prefix = 'cookietest_'
+
+    def setUp(self):
+        super(CookieTestCase, self).setUp()
+        self.path = os.path.join(self.dir, 'state')
+
+
+class AtomicCookieTest(CookieTestCase):
+
+    def test_commit_replaces_state_file(self):
+        with Cookie(self.path, atomic=True) as c:
+            c['hello'] = 'wörld'
+        with open(self.path) as f:
+            self.assertEqual('{"hello": "w\\u00f6rld"}\n', f.read())
+        with Cookie(self.path, atomic=True) as c:
+            self.assertEqual('wörld', c['hello'])
+
+    def test_new_inode_on_commit(self):
+        with open(self.path, 'w') as f:
+            f.write('{"key": 1}\n')
+        inode = os.stat(self.path).st_ino
+        with Cookie(self.path, atomic=True) as c:
+            c['key'] = 2
+        self.assertNotEqual(inode, os.stat(self.path).st_ino)
+
+    def test_locks_separate_file(self):
+        with Cookie(self.path, atomic=True):
+            self.assertTrue(os.path.exists(self.path + '.lock'))
+        self.assertEqual(['state.lock'], os.listdir(self.dir))
+
+    def test_unchanged_cookie_is_not_rewritten(self):
+        with open(self.path, 'w') as f:
+            f.write('{"key": 1}\n')
+        inode = os.stat(self.path).st_ino
+        with Cookie(self.path, atomic=True) as c:
+            c['key'] = 1
+        self.assertEqual(inode, os.stat(self.path).st_ino)
+
+    def test_failed_commit_keeps_old_state(self):
+        with open(self.path, 'w') as f:
+            f.write('{"key": 1}\n')
+        with self.assertRaises(TypeError):
+            with Cookie(self.path, atomic=True) as c:
+                c['key'] = object()
+                c.commit()
+        with open(self.path) as f:
+            self.assertEqual('{"key": 1}\n', f.read())
+        self.assertEqual(['state', 'state.lock'], sorted(os.listdir(self.dir)))
+
+    def test_corrupted_state_file_is_emptied(self):
+        with open(self.path, 'w') as f:
+            f.write('{{{')
+        c = Cookie(self.path, atomic=True)
+        with self.assertRaises(ValueError):
+            c.open()
+        c.close()
+        self.assertEqual(0, os.stat(self.path).st_size)
+
+    def test_replace_keeps_file_mode(self):
+        with open(self.path, 'w') as f:
+            f.write('{}\n')
+        os.chmod(self.path, 0o640)
+        with Cookie(self.path, atomic=True) as c:
+            c['key'] = 1
+        self.assertEqual(0o640, stat.S_IMODE(os.stat(self.path).st_mode))
+
+    def test_new_state_file_respects_umask(self):
+        umask = os.umask(0o027)
+        try:
+            with Cookie(self.path, atomic=True) as c:
+                c['key'] = 1
+        finally:
+            os.umask(umask)
+        self.assertEqual(0o640, stat.S_IMODE(os.stat(self.path).st_mode))
+
+    def test_commit_closed_cookie_fails(self):
+        with self.assertRaises(IOError):
+            with Cookie(self.path, atomic=True) as c:
+                c.close()
+
+    def test_dirty_tracks_nested_changes(self):
+        with open(self.path, 'w') as f:
+            f.write('{"counters": {"a": 1}}\n')
+        with Cookie(self.path, atomic=True) as c:
+            self.assertFalse(c.dirty)
+            c['counters']['a'] += 1
+            self.assertTrue(c.dirty)
+            c.commit()
+            self.assertFalse(c.dirty)
+        with open(self.path) as f:
+            self.assertEqual('{"counters": {"a": 2}}\n', f.read())
+
+
+class DurabilityTest(CookieTestCase):
+
+    def setUp(self):
+        super(DurabilityTest, self).setUp()
+        self.write('', 'state')
+
+    def test_unknown_durability_mode(self):
+        with self.assertRaises(ValueError):
+            Cookie(self.path, durability='sometimes')
+
+    def test_no_sync_if_durability_none(self):
+        with mock.patch('os.fsync') as fsync:
+            with Cookie(self.path, durability='none') as c:
+                c['key'] = 1
+        self.assertFalse(fsync.called)
+        with open(self.path) as f:
+            self.assertEqual('{"key": 1}\n', f.read())
+
+    @unittest.skipUnless(hasattr(os, 'fdatasync'), 'fdatasync unavailable')
+    def test_fdatasync(self):
+        with mock.patch('os.fdatasync') as fdatasync:
+            with Cookie(self.path, durability='fdatasync') as c:
+                c['key'] = 1
+        self.assertTrue(fdatasync.called)
+
+    def test_readonly_use_does_not_sync(self):
+        with open(self.path, 'w') as f:
+            f.write('{"key": 1}\n')
+        with mock.patch('os.fsync') as fsync:
+            with Cookie(self.path) as c:
+                c.get('key')
+        self.assertFalse(fsync.called)
+
+
+class LockingTest(CookieTestCase):
+
+    def setUp(self):
+        super(LockingTest, self).setUp()
+        self.write('{"key": 1}\n', 'state')
+
+    def test_readers_share_lock(self):
+        with Cookie(self.path, mode='r') as c1:
+            with Cookie(self.path, mode='r', lock_timeout=0.1) as c2:
+                self.assertEqual(c1['key'], c2['key'])
+
+    def test_reader_waits_for_writer(self):
+        with Cookie(self.path):
+            with self.assertRaises(CheckError):
+                Cookie(self.path, mode='r', lock_timeout=0.1).open()
+
+    def test_writer_waits_for_reader(self):
+        with Cookie(self.path, mode='r'):
+            c = Cookie(self.path, lock_timeout=0.1)
+            with self.assertRaises(CheckError):
+                c.open()
+            self.assertIsNone(c.fobj)
+
+    def test_log_lock_wait_time(self):
+        holder = Cookie(self.path).open()
+        threading.Timer(0.1, holder.close).start()
+        with self.assertLogs('nagiosplugin.cookie', 'DEBUG') as cm:
+            with Cookie(self.path, lock_timeout=5) as c:
+                c['key'] = 2
+        self.assertRegex(cm.output[0], r'waited 0\.\d+s for lock on cookie')
+
+    def test_commit_changed_readonly_cookie_fails(self):
+        with self.assertRaises(IOError):
+            with Cookie(self.path, mode='r') as c:
+                c['key'] = 2
+        with open(self.path) as f:
+            self.assertEqual('{"key": 1}\n', f.read())
+
+    def test_readonly_cookie_does_not_create_state_file(self):
+        os.unlink(self.path)
+        with Cookie(self.path, mode='r') as c:
+            self.assertEqual({}, c.data)
+        self.assertFalse(os.path.exists(self.path))
+        open(self.path, 'w').close()
+
+    def test_readonly_cookie_does_not_truncate_corrupted_file(self):
+        with open(self.path, 'w') as f:
+            f.write('{{{')
+        c = Cookie(self.path, mode='r')
+        with self.assertRaises(ValueError):
+            c.open()
+        c.close()
+        self.assertEqual(3, os.stat(self.path).st_size)
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            Cookie(self.path, mode='a')
+
+
+class SQLiteCookieTest(CookieTestCase):
+
+    def setUp(self):
+        super(SQLiteCookieTest, self).setUp()
+        self.db = os.path.join(self.dir, 'state.db')
+
+    def rows(self):
+        conn = sqlite3.connect(self.db)
+        try:
+            return sorted(conn.execute('SELECT * FROM cookie'))
+        finally:
+            conn.close()
+
+    def test_persist_items(self):
+        with SQLiteCookie(self.db, 'svc') as c:
+            c['hello'] = 'wörld'
+            c['nested'] = {'a': [1, 2]}
+        with SQLiteCookie(self.db, 'svc') as c:
+            self.assertEqual({'hello': 'wörld', 'nested': {'a': [1, 2]}},
+                             c.data)
+
+    def test_namespaces_are_separate(self):
+        with SQLiteCookie(self.db, 'svc1') as c:
+            c['key'] = 1
+        with SQLiteCookie(self.db, 'svc2') as c:
+            self.assertNotIn('key', c)
+            c['key'] = 2
+        self.assertEqual([('svc1', 'key', '1'), ('svc2', 'key', '2')],
+                         self.rows())
+
+    def test_uses_wal_mode(self):
+        with SQLiteCookie(self.db, 'svc') as c:
+            mode = c.conn.execute('PRAGMA journal_mode').fetchone()[0]
+        self.assertEqual('wal', mode)
+
+    def test_commit_writes_changed_items_only(self):
+        with SQLiteCookie(self.db, 'svc') as c:
+            c.update(a=1, b=2, c=3)
+        with SQLiteCookie(self.db, 'svc') as c:
+            c['a'] = 10
+            del c['b']
+            _rows, updated, deleted = c._changes()
+            self.assertEqual([('svc', 'a', '10')], updated)
+            self.assertEqual([('svc', 'b')], deleted)
+        self.assertEqual([('svc', 'a', '10'), ('svc', 'c', '3')],
+                         self.rows())
+
+    def test_dirty(self):
+        with SQLiteCookie(self.db, 'svc') as c:
+            c['counters'] = {'a': 1}
+            self.assertTrue(c.dirty)
+            c.commit()
+            self.assertFalse(c.dirty)
+            c['counters']['a'] += 1
+            self.assertTrue(c.dirty)
+
+    def test_concurrent_cookies(self):
+        c1 = SQLiteCookie(self.db, 'svc1').open()
+        c2 = SQLiteCookie(self.db, 'svc2').open()
+        c1['key'] = 1
+        c2['key'] = 2
+        c2.commit()
+        c1.commit()
+        c1.close()
+        c2.close()
+        self.assertEqual(2, len(self.rows()))
+
+    def test_no_commit_on_exception(self):
+        with self.assertRaises(RuntimeError):
+            with SQLiteCookie(self.db, 'svc') as c:
+                c['key'] = 1
+                raise RuntimeError()
+        self.assertEqual([], self.rows())
+
+    def test_migrate_from_json_state_file(self):
+        statefile = os.path.join(self.dir, 'state.json')
+        with open(statefile, 'w') as f:
+            f.write('{"key": 1}\n')
+        with SQLiteCookie(self.db, 'svc', migrate_from=statefile) as c:
+            self.assertEqual(1, c['key'])
+            c['key'] = 2
+        with SQLiteCookie(self.db, 'svc', migrate_from=statefile) as c:
+            self.assertEqual(2, c['key'])
+        with open(statefile) as f:
+            self.assertEqual('{"key": 1}\n', f.read())
+
+    def test_migrate_from_missing_state_file(self):
+        statefile = os.path.join(self.dir, 'state.json')
+        with SQLiteCookie(self.db, 'svc', migrate_from=statefile) as c:
+            self.assertEqual({}, c.data)
+        self.assertFalse(os.path.exists(statefile))
+
+    def test_migrate_leaves_corrupted_state_file_untouched(self):
+        statefile = os.path.join(self.dir, 'state.json')
+        with open(statefile, 'w') as f:
+            f.write('{{{')
+        c = SQLiteCookie(self.db, 'svc', migrate_from=statefile)
+        with self.assertRaises(ValueError):
+            c.open()
+        self.assertTrue(c.closed)
+        with open(statefile) as f:
+            self.assertEqual('{{{', f.read())
+
+    def test_corrupted_item_should_raise(self):
+        with SQLiteCookie(self.db, 'svc') as c:
+            c['key'] = 1
+        conn = sqlite3.connect(self.db)
+        with conn:
+            conn.execute("UPDATE cookie SET value = '{{{'")
+        conn.close()
+        c = SQLiteCookie(self.db, 'svc')
+        with self.assertRaises(ValueError):
+            c.open()
+        self.assertTrue(c.closed)
+        self.assertEqual([], self.rows())
+
+    def test_commit_closed_cookie_fails(self):
+        with self.assertRaises(IOError):
+            with SQLiteCookie(self.db, 'svc') as c:
+                c.close()
+
+    def test_oblivious_cookie(self):
+        with SQLiteCookie(None, 'svc') as c:
+            c['key'] = 1
+        self.assertEqual(1, c['key'])
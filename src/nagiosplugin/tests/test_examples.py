@@ -2,6 +2,7 @@ import pkg_resources
 import re
 import subprocess
 import sys
+import tempfile
 import os.path as p
 import unittest
 
@@ -9,10 +10,10 @@ import unittest
 class ExamplesTest(unittest.TestCase):
     base = p.normpath(p.join(p.dirname(p.abspath(__file__)), '..', '..'))
 
-    def _run_example(self, program, regexp):
+    def _run_example(self, program, regexp, *args):
         proc = subprocess.Popen([
             sys.executable, pkg_resources.resource_filename(
-                'nagiosplugin.examples', program), '-v'],
+                'nagiosplugin.examples', program), '-v'] + list(args),
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE, env={'PYTHONPATH': ':'.join(sys.path)})
         out, err = proc.communicate()
@@ -39,3 +40,11 @@ users: .*
 
     def test_check_world(self):
         self._run_example('check_world.py', '^WORLD OK - True$')
+
+    def test_check_haproxy_log(self):
+        with tempfile.NamedTemporaryFile(prefix='cookie.') as state:
+            self._run_example('check_haproxy_log.py', """\
+HAPROXYLOG OK - total time \\(50.pct\\) is 0.31\\d*s
+\\| error_rate=2.76\\d*%;;;0;100 request_total=1956;;;0
+ttot50=0.31\\d*s;;;0 ttot95=1.4\\d*s;;;0
+""", '-s', state.name, p.join(self.base, '..', 'data', 'haproxy.log'))
@@ -0,0 +1,99 @@
+from nagiosplugin.fields import FieldExtractor
+import array
+import re
+import unittest
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+LOG = b'''\
+GET /a 200 512 0.010
+GET /b 404 0 0.002
+bogus line
+POST /c 500 17 1.500
+'''
+PATTERN = rb'^(?P<method>[A-Z]+) \S+ (?P<status>\d{3}) (?P<size>\d+) ' \
+    rb'(?P<time>[\d.]+)$'
+
+
+class FieldExtractorTest(unittest.TestCase):
+
+    def extractor(self, **kw):
+        return FieldExtractor(PATTERN, use_numpy=False, method=bytes,
+                              status=int, time=float, **kw)
+
+    def test_extract_columns(self):
+        columns = self.extractor().extract(LOG)
+        self.assertEqual([b'GET', b'GET', b'POST'], columns['method'])
+        self.assertEqual(array.array('q', [200, 404, 500]),
+                         columns['status'])
+        self.assertEqual(array.array('d', [0.01, 0.002, 1.5]),
+                         columns['time'])
+
+    def test_memoryview(self):
+        columns = self.extractor().extract(memoryview(LOG))
+        self.assertEqual([200, 404, 500], list(columns['status']))
+
+    def test_no_match(self):
+        columns = self.extractor().extract(b'bogus\n')
+        self.assertEqual(0, len(columns['status']))
+
+    def test_single_group(self):
+        fx = FieldExtractor(rb'(?P<n>\d+)$', use_numpy=False, n=int)
+        self.assertEqual([1, 22], list(fx.extract(b'a 1\nb 22\n')['n']))
+
+    def test_compiled_pattern(self):
+        fx = FieldExtractor(re.compile(rb'^\S+ \S+ (?P<status>\d+)', re.M),
+                            use_numpy=False, status=int)
+        self.assertEqual([200, 404, 500], list(fx.extract(LOG)['status']))
+
+    def test_extract_all(self):
+        columns = self.extractor().extract_all([LOG, LOG])
+        self.assertEqual(6, len(columns['status']))
+        self.assertEqual(6, len(columns['method']))
+
+    def test_count(self):
+        fx = self.extractor()
+        status = fx.extract(LOG)['status']
+        self.assertEqual(1, fx.count(status, 200, 400))
+        self.assertEqual(2, fx.count(status, 400))
+        self.assertEqual(2, fx.count(status, high=500))
+        self.assertEqual(3, fx.count(status))
+
+    def test_missing_group(self):
+        with self.assertRaises(ValueError):
+            FieldExtractor(PATTERN, duration=float)
+
+    def test_unsupported_type(self):
+        with self.assertRaises(ValueError):
+            FieldExtractor(PATTERN, status=complex)
+
+
+@unittest.skipIf(numpy is None, 'numpy is not installed')
+class NumpyFieldExtractorTest(unittest.TestCase):
+
+    def test_extract_arrays(self):
+        columns = FieldExtractor(PATTERN, status=int, time=float,
+                                 method=bytes).extract(LOG)
+        self.assertEqual(numpy.int64, columns['status'].dtype)
+        self.assertEqual([200, 404, 500], columns['status'].tolist())
+        self.assertEqual([0.01, 0.002, 1.5], columns['time'].tolist())
+        self.assertEqual([b'GET', b'GET', b'POST'],
+                         columns['method'].tolist())
+
+    def test_no_match(self):
+        columns = FieldExtractor(PATTERN, status=int).extract(b'')
+        self.assertEqual(0, len(columns['status']))
+
+    def test_extract_all(self):
+        columns = FieldExtractor(PATTERN, status=int).extract_all([LOG, LOG])
+        self.assertEqual(6, len(columns['status']))
+
+    def test_count(self):
+        fx = FieldExtractor(PATTERN, status=int)
+        status = fx.extract(LOG)['status']
+        self.assertEqual(1, fx.count(status, 200, 400))
+        self.assertEqual(2, fx.count(status, 400))
+        self.assertEqual(3, fx.count(status))
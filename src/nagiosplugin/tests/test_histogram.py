@@ -0,0 +1,121 @@
+from nagiosplugin.histogram import Histogram, rolling_window
+import json
+import math
+import nagiosplugin
+import random
+import tempfile
+import unittest
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+
+def exact_percentile(values, percent):
+    values = sorted(values)
+    return values[max(1, math.ceil(percent / 100 * len(values))) - 1]
+
+
+class HistogramTest(unittest.TestCase):
+
+    def test_empty(self):
+        h = Histogram()
+        self.assertEqual(0, len(h))
+        self.assertEqual([None, None], h.percentiles([50, 95]))
+        self.assertIsNone(h.mean)
+
+    def test_small_values_are_exact(self):
+        h = Histogram().update(range(1, 101))
+        self.assertEqual([1, 50, 95, 100], h.percentiles([0, 50, 95, 100]))
+
+    def test_relative_error(self):
+        rnd = random.Random(42)
+        values = [int(rnd.expovariate(1e-4)) for _ in range(10000)]
+        h = Histogram(precision=2).update(values)
+        for pct in (10, 50, 90, 99, 99.9):
+            exact = exact_percentile(values, pct)
+            self.assertLessEqual(abs(h.percentile(pct) - exact),
+                                 exact * 0.01, pct)
+
+    def test_bounded_memory(self):
+        h = Histogram(precision=2)
+        for i in range(100000):
+            h.add(i % 5000)
+        self.assertLess(len(h.counts), 1000)
+        self.assertEqual(100000, len(h))
+
+    def test_min_max_and_mean(self):
+        h = Histogram().update([12345, 3, 99999])
+        self.assertEqual((3, 99999), (h.min, h.max))
+        self.assertEqual([3, 99999], h.percentiles([0, 100]))
+        self.assertEqual(37449, h.mean)
+
+    def test_resolution(self):
+        h = Histogram(resolution=0.001).update([0.25, 0.5, 1.5])
+        self.assertAlmostEqual(0.5, h.percentile(50), delta=0.005)
+
+    def test_negative_value(self):
+        with self.assertRaises(ValueError):
+            Histogram().add(-1)
+
+    def test_merge(self):
+        a = Histogram().update(range(100))
+        b = Histogram().update(range(100, 200))
+        a.merge(b)
+        self.assertEqual(200, len(a))
+        self.assertEqual((0, 199), (a.min, a.max))
+        self.assertAlmostEqual(99, a.percentile(50), delta=1)
+
+    def test_merge_different_layout(self):
+        with self.assertRaises(ValueError):
+            Histogram(precision=2).merge(Histogram(precision=3))
+
+    def test_serialization(self):
+        h = Histogram(precision=3).update([1, 5000, 123456])
+        copy = Histogram.from_dict(json.loads(json.dumps(h.to_dict())))
+        self.assertEqual(h.counts, copy.counts)
+        self.assertEqual(h.percentiles([0, 50, 100]),
+                         copy.percentiles([0, 50, 100]))
+
+
+@unittest.skipIf(numpy is None, 'numpy is not installed')
+class NumpyHistogramTest(unittest.TestCase):
+
+    def test_update_from_array(self):
+        values = numpy.arange(0, 100000, 7)
+        expected = Histogram().update(values.tolist())
+        h = Histogram().update(values)
+        self.assertEqual(expected.counts, h.counts)
+        self.assertEqual((expected.min, expected.max, expected.total),
+                         (h.min, h.max, h.total))
+
+    def test_update_from_array_rejects_negative_values(self):
+        with self.assertRaises(ValueError):
+            Histogram().update(numpy.array([1, -1]))
+
+
+class RollingWindowTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cf = tempfile.NamedTemporaryFile(prefix='cookie.')
+
+    def tearDown(self):
+        self.cf.close()
+
+    def run_once(self, values, now):
+        with nagiosplugin.Cookie(self.cf.name) as cookie:
+            return rolling_window(cookie, 'ttot', Histogram().update(values),
+                                  window=300, now=now)
+
+    def test_merge_within_window(self):
+        self.run_once([1, 2], now=1000)
+        h = self.run_once([3], now=1200)
+        self.assertEqual(3, len(h))
+
+    def test_discard_old_histograms(self):
+        self.run_once([1, 2], now=1000)
+        self.run_once([3], now=1200)
+        h = self.run_once([4], now=1400)
+        self.assertEqual(2, len(h))
+        self.assertEqual(3, h.min)
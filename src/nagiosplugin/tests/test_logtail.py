@@ -1,9 +1,32 @@
-from nagiosplugin.logtail import LogTail
+from nagiosplugin.logtail import LogTail, MMapLogTail, MultiLogTail
+from nagiosplugin.tests.util import TempDirTestCase
+import bz2
+import gzip
+import lzma
+import mmap
+import os
 import nagiosplugin
+import re
+import shutil
 import tempfile
 import unittest
 
 
+class LogTailTestCase(TempDirTestCase):
+    """Provides an empty log file :attr:`path` and a :attr:`cookie`."""
+
+    prefix = 'logtail.'
+
+    def setUp(self):
+        super(LogTailTestCase, self).setUp()
+        self.path = self.write(b'')
+        self.statefile = os.path.join(self.dir, 'cookie')
+        self.cookie = nagiosplugin.Cookie(self.statefile)
+
+    def write(self, data, name='log', mode=None):
+        return super(LogTailTestCase, self).write(data, name, mode)
+
+
 class LogTailTest(unittest.TestCase):
 
     def setUp(self):
@@ -44,3 +67,471 @@ class LogTailTest(unittest.TestCase):
             pass
         with LogTail(self.lf.name, self.cookie) as tail:
             self.assertEqual([b'first line\n'], list(tail))
+
+
+class BatchLogTailTest(LogTailTestCase):
+
+    def test_lists_of_lines(self):
+        self.write(b'one\ntwo\nthree\n')
+        with LogTail(self.path, self.cookie, batch='lines',
+                     blocksize=6) as tail:
+            self.assertEqual([[b'one\n'], [b'two\n'], [b'three\n']],
+                             list(tail))
+
+    def test_chunks(self):
+        self.write(b'one\ntwo\nthree\n')
+        with LogTail(self.path, self.cookie, batch='chunks') as tail:
+            chunks = list(tail)
+        self.assertIsInstance(chunks[0], memoryview)
+        self.assertEqual([b'one\ntwo\nthree\n'], [bytes(c) for c in chunks])
+
+    def test_hold_back_incomplete_line(self):
+        self.write(b'one\ntw')
+        logtail = LogTail(self.path, self.cookie, batch='lines')
+        with logtail as tail:
+            self.assertEqual([[b'one\n']], list(tail))
+        self.assertEqual(4, logtail.pos)
+        self.write(b'o\n')
+        with LogTail(self.path, self.cookie, batch='lines') as tail:
+            self.assertEqual([[b'two\n']], list(tail))
+
+    def test_line_longer_than_blocksize(self):
+        self.write(b'a long line\nx\n')
+        with LogTail(self.path, self.cookie, batch='chunks',
+                     blocksize=4) as tail:
+            self.assertEqual([b'a long line\n', b'x\n'],
+                             [bytes(c) for c in tail])
+
+    def test_position_after_last_consumed_batch(self):
+        self.write(b'one\ntwo\n')
+        with LogTail(self.path, self.cookie, batch='lines',
+                     blocksize=4) as tail:
+            self.assertEqual([b'one\n'], next(tail))
+        with LogTail(self.path, self.cookie, batch='lines') as tail:
+            self.assertEqual([[b'two\n']], list(tail))
+
+    def test_unknown_batch_mode(self):
+        with self.assertRaises(ValueError):
+            LogTail(self.path, self.cookie, batch='words')
+
+
+class MMapLogTailTest(LogTailTestCase):
+
+    def test_empty_file(self):
+        with MMapLogTail(self.path, self.cookie) as tail:
+            self.assertEqual([], list(tail))
+
+    def test_scan_view(self):
+        self.write(b'a=1\nb=2\n')
+        with MMapLogTail(self.path, self.cookie) as tail:
+            view = next(tail)
+            self.assertIsInstance(view, memoryview)
+            self.assertEqual([b'1', b'2'], [m.group(1) for m in re.finditer(
+                rb'=(\d+)', view)])
+
+    def test_successive_reads_with_unaligned_offset(self):
+        self.write(b'x' * (mmap.ALLOCATIONGRANULARITY + 10) + b'\n')
+        with MMapLogTail(self.path, self.cookie) as tail:
+            self.assertEqual(1, len(list(tail)))
+        self.write(b'second\n')
+        with MMapLogTail(self.path, self.cookie) as tail:
+            self.assertEqual([b'second\n'], [bytes(v) for v in tail])
+
+    def test_hold_back_incomplete_line(self):
+        self.write(b'one\ntw')
+        with MMapLogTail(self.path, self.cookie) as tail:
+            self.assertEqual([b'one\n'], [bytes(v) for v in tail])
+        self.write(b'o\n')
+        with MMapLogTail(self.path, self.cookie) as tail:
+            self.assertEqual([b'two\n'], [bytes(v) for v in tail])
+
+    def test_segments(self):
+        self.write(b'one\ntwo\nthree\nfour')
+        with MMapLogTail(self.path, self.cookie, segmentsize=5) as tail:
+            self.assertEqual([b'one\n', b'two\n', b'three\n'],
+                             [bytes(v) for v in tail])
+
+    def test_release_with_exported_slices(self):
+        self.write(b'one\ntwo\n')
+        with MMapLogTail(self.path, self.cookie) as tail:
+            kept = next(tail)[4:]
+        self.assertEqual(b'two\n', bytes(kept))
+        with MMapLogTail(self.path, self.cookie) as tail:
+            self.assertEqual([], list(tail))
+
+
+class RotationTest(LogTailTestCase):
+
+    def setUp(self):
+        super(RotationTest, self).setUp()
+        self.write(b'first\n')
+        self.read()
+
+    def read(self, **kw):
+        with LogTail(self.path, self.cookie, **kw) as tail:
+            return list(tail)
+
+    def test_read_rest_of_rotated_file(self):
+        self.write(b'second\n')
+        os.rename(self.path, self.path + '.1')
+        self.write(b'third\n')
+        self.assertEqual([b'second\n', b'third\n'], self.read())
+        self.assertEqual([], self.read())
+
+    def test_dateext(self):
+        self.write(b'second\n')
+        os.rename(self.path, self.path + '-20260101')
+        self.write(b'third\n')
+        self.assertEqual([b'second\n', b'third\n'], self.read())
+
+    def test_custom_pattern(self):
+        self.write(b'second\n')
+        os.rename(self.path, os.path.join(self.dir, 'old.log'))
+        self.write(b'third\n')
+        self.assertEqual([b'second\n', b'third\n'], self.read(
+            rotated=os.path.join(self.dir, '*.log')))
+
+    def test_rotated_file_not_found(self):
+        self.write(b'second\n')
+        os.rename(self.path, os.path.join(self.dir, 'elsewhere'))
+        self.write(b'third\n')
+        self.assertEqual([b'third\n'], self.read())
+
+    def test_resume_within_rotated_file(self):
+        self.write(b'second\nthird\n')
+        os.rename(self.path, self.path + '.1')
+        self.write(b'fourth\n')
+        with LogTail(self.path, self.cookie) as tail:
+            self.assertEqual(b'second\n', next(tail))
+        self.assertEqual([b'third\n', b'fourth\n'], self.read())
+
+    def test_batch_mode(self):
+        self.write(b'second\n')
+        os.rename(self.path, self.path + '.1')
+        self.write(b'third\n')
+        self.assertEqual([[b'second\n'], [b'third\n']],
+                         self.read(batch='lines'))
+
+    def test_mmap(self):
+        self.write(b'second\n')
+        os.rename(self.path, self.path + '.1')
+        self.write(b'third\n')
+        with MMapLogTail(self.path, self.cookie) as tail:
+            self.assertEqual([b'second\n', b'third\n'],
+                             [bytes(v) for v in tail])
+
+    def compress(self, opener, suffix):
+        with open(self.path, 'rb') as src:
+            with opener(self.path + suffix, 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+        os.unlink(self.path)
+
+    def test_compressed_rotated_files(self):
+        for opener, suffix in [(gzip.open, '.1.gz'), (bz2.open, '.1.bz2'),
+                               (lzma.open, '.1.xz')]:
+            line = suffix.encode() + b'\n'
+            self.write(b'old ' + line)
+            self.compress(opener, suffix)
+            self.write(b'new ' + line)
+            self.assertEqual([b'old ' + line, b'new ' + line], self.read())
+            os.unlink(self.path + suffix)
+
+    def test_resume_within_compressed_file(self):
+        self.write(b'second\nthird\n')
+        self.compress(gzip.open, '-20260101.gz')
+        self.write(b'fourth\n')
+        with LogTail(self.path, self.cookie) as tail:
+            self.assertEqual(b'second\n', next(tail))
+        self.assertEqual([b'third\n', b'fourth\n'], self.read())
+
+    def test_compressed_file_mmap(self):
+        self.write(b'second\n')
+        self.compress(gzip.open, '.1.gz')
+        self.write(b'third\n')
+        with MMapLogTail(self.path, self.cookie) as tail:
+            self.assertEqual([b'second\n', b'third\n'],
+                             [bytes(v) for v in tail])
+
+    def test_ignore_unrelated_compressed_file(self):
+        self.write(b'second\n')
+        os.rename(self.path, os.path.join(self.dir, 'elsewhere'))
+        with gzip.open(self.path + '.1.gz', 'wb') as f:
+            f.write(b'other content\n')
+        self.write(b'third\n')
+        self.assertEqual([b'third\n'], self.read())
+
+    def test_copytruncate_with_copy(self):
+        self.write(b'second\n')
+        shutil.copyfile(self.path, self.path + '.1')
+        os.truncate(self.path, 0)
+        self.write(b'third\n')
+        self.assertEqual([b'second\n', b'third\n'], self.read())
+
+    def test_copytruncate(self):
+        self.write(b'second\n')
+        self.read()
+        self.write(b'new\n', mode='r+b')
+        os.truncate(self.path, 4)
+        self.assertEqual([b'new\n'], self.read())
+
+
+class MultiLogTailTest(LogTailTestCase):
+
+    def setUp(self):
+        super(MultiLogTailTest, self).setUp()
+        self.pattern = os.path.join(self.dir, '*.log')
+
+    def read(self, **kw):
+        lines = {}
+        with MultiLogTail(self.pattern, self.cookie, **kw) as tail:
+            for path, batch in tail:
+                lines.setdefault(os.path.basename(path), []).extend(batch)
+        return lines
+
+    def test_read_all_files(self):
+        for i in range(10):
+            self.write('line {0}\n'.format(i).encode(), '{0}.log'.format(i))
+        lines = self.read(max_workers=3)
+        self.assertEqual(10, len(lines))
+        self.assertEqual([b'line 3\n'], lines['3.log'])
+
+    def test_successive_reads(self):
+        self.write(b'one\n', 'a.log')
+        self.write(b'two\n', 'b.log')
+        self.read()
+        self.write(b'three\n', 'a.log')
+        self.assertEqual({'a.log': [b'three\n']}, self.read())
+        self.assertEqual({}, self.read())
+
+    def test_order_within_file(self):
+        self.write(b''.join(b'%d\n' % i for i in range(1000)), 'a.log')
+        lines = self.read(blocksize=64, queuesize=2)
+        self.assertEqual([b'%d\n' % i for i in range(1000)], lines['a.log'])
+
+    def test_single_commit(self):
+        self.write(b'one\n', 'a.log')
+        self.write(b'two\n', 'b.log')
+        commits = []
+        commit = self.cookie.commit
+        self.cookie.commit = lambda: commits.append(commit())
+        self.read()
+        self.assertEqual(1, len(commits))
+
+    def test_early_exit_offers_unconsumed_data_again(self):
+        self.write(b''.join(b'%d\n' % i for i in range(100)), 'a.log')
+        with MultiLogTail(self.pattern, self.cookie, blocksize=16,
+                          queuesize=1) as tail:
+            _path, first = next(tail)
+        lines = self.read()
+        self.assertEqual([b'%d\n' % i for i in range(len(first), 100)],
+                         lines['a.log'])
+
+    def test_no_commit_on_exception(self):
+        self.write(b'one\n', 'a.log')
+        with self.assertRaises(RuntimeError):
+            with MultiLogTail(self.pattern, self.cookie) as tail:
+                list(tail)
+                raise RuntimeError()
+        self.assertEqual({'a.log': [b'one\n']}, self.read())
+
+    def test_no_files(self):
+        self.assertEqual({}, self.read())
+
+
+class BudgetTest(LogTailTestCase):
+
+    def setUp(self):
+        super(BudgetTest, self).setUp()
+        self.write(b''.join(b'%d\n' % i for i in range(10)))
+
+    def read(self, cls=LogTail, **kw):
+        logtail = cls(self.path, self.cookie, **kw)
+        with logtail as tail:
+            return list(tail), logtail.truncated
+
+    def test_max_lines(self):
+        self.assertEqual(([b'0\n', b'1\n', b'2\n'], True),
+                         self.read(max_lines=3))
+        self.assertEqual(([b'%d\n' % i for i in range(3, 10)], False),
+                         self.read())
+
+    def test_max_lines_batch(self):
+        lines, truncated = self.read(batch='lines', blocksize=4, max_lines=3)
+        self.assertEqual([[b'0\n', b'1\n'], [b'2\n', b'3\n']], lines)
+        self.assertTrue(truncated)
+
+    def test_max_lines_with_chunks(self):
+        with self.assertRaises(ValueError):
+            LogTail(self.path, self.cookie, batch='chunks', max_lines=1)
+
+    def test_max_bytes(self):
+        self.assertEqual(([b'0\n', b'1\n'], True), self.read(max_bytes=4))
+        self.assertEqual(([b'2\n'], True), self.read(max_bytes=1))
+
+    def test_max_bytes_mmap(self):
+        logtail = MMapLogTail(self.path, self.cookie, max_bytes=4)
+        with logtail as tail:
+            self.assertEqual([b'0\n1\n'], [bytes(v) for v in tail])
+        self.assertTrue(logtail.truncated)
+
+    def test_max_time(self):
+        lines, truncated = self.read(max_time=1e-9)
+        self.assertEqual([b'0\n'], lines)
+        self.assertTrue(truncated)
+
+    def test_budget_not_exhausted(self):
+        lines, truncated = self.read(max_lines=10, max_bytes=20)
+        self.assertEqual(10, len(lines))
+        self.assertFalse(truncated)
+
+    def test_skip_backlog(self):
+        with open(self.path, 'ab') as f:
+            f.write(b'incomplete')
+        self.assertEqual(([], True), self.read(batch='lines',
+                                               skip_backlog=10))
+        with open(self.path, 'ab') as f:
+            f.write(b' line\nnew\n')
+        self.assertEqual(([[b'incomplete line\n', b'new\n']], False),
+                         self.read(batch='lines', skip_backlog=100))
+
+    def test_budget_within_rotated_file(self):
+        self.read(max_lines=2)
+        os.rename(self.path, self.path + '.1')
+        with open(self.path, 'wb') as f:
+            f.write(b'new\n')
+        self.assertEqual(([b'2\n', b'3\n'], True), self.read(max_lines=2))
+        lines, truncated = self.read()
+        self.assertEqual([b'%d\n' % i for i in range(4, 10)] + [b'new\n'],
+                         lines)
+
+
+class CheckpointTest(LogTailTestCase):
+
+    def setUp(self):
+        super(CheckpointTest, self).setUp()
+        self.write(b''.join(b'%d\n' % i for i in range(10)))
+
+    def interrupted_read(self, lines, **kw):
+        cookie = nagiosplugin.Cookie(self.statefile, atomic=True)
+        with self.assertRaises(nagiosplugin.Timeout):
+            with LogTail(self.path, cookie, **kw) as tail:
+                for _ in range(lines):
+                    next(tail)
+                raise nagiosplugin.Timeout()
+
+    def read(self):
+        cookie = nagiosplugin.Cookie(self.statefile, atomic=True)
+        with LogTail(self.path, cookie) as tail:
+            return list(tail)
+
+    def test_keep_progress_after_exception(self):
+        self.interrupted_read(5, checkpoint_bytes=4)
+        # lines 0-3 have been consumed completely at the last checkpoint
+        self.assertEqual([b'%d\n' % i for i in range(4, 10)], self.read())
+
+    def test_checkpoint_interval(self):
+        self.interrupted_read(3, checkpoint_interval=1e-9)
+        self.assertEqual([b'%d\n' % i for i in range(2, 10)], self.read())
+
+    def test_no_checkpoints_by_default(self):
+        self.interrupted_read(5)
+        self.assertEqual(10, len(self.read()))
+
+    def test_checkpoints_refuse_non_atomic_cookie(self):
+        cookie = nagiosplugin.Cookie(self.statefile)
+        with self.assertRaises(ValueError):
+            LogTail(self.path, cookie, checkpoint_bytes=4)
+
+    def test_checkpoints_with_sqlite_cookie(self):
+        database = os.path.join(self.dir, 'state.db')
+        cookie = nagiosplugin.SQLiteCookie(database, 'test')
+        with self.assertRaises(nagiosplugin.Timeout):
+            with LogTail(self.path, cookie, checkpoint_bytes=4) as tail:
+                for _ in range(5):
+                    next(tail)
+                raise nagiosplugin.Timeout()
+        with nagiosplugin.SQLiteCookie(database, 'test') as cookie:
+            self.assertEqual(8, cookie[self.path]['pos'])
+
+    def test_checkpoint_saves_cookie_content(self):
+        cookie = nagiosplugin.Cookie(self.statefile, atomic=True)
+        with self.assertRaises(nagiosplugin.Timeout):
+            with LogTail(self.path, cookie, batch='lines', blocksize=4,
+                         checkpoint_bytes=1) as tail:
+                for lines in tail:
+                    cookie['count'] = cookie.get('count', 0) + len(lines)
+                    if cookie['count'] >= 4:
+                        raise nagiosplugin.Timeout()
+        with nagiosplugin.Cookie(self.statefile) as cookie:
+            self.assertEqual(2, cookie['count'])
+        self.assertEqual([b'%d\n' % i for i in range(2, 10)], self.read())
+
+
+class PrefilterTest(LogTailTestCase):
+
+    def setUp(self):
+        super(PrefilterTest, self).setUp()
+        self.write(b'haproxy: one\nsshd: two\nhaproxy: three\n'
+                   b'cron: four\nhaproxy: five\n')
+
+    def read(self, **kw):
+        with LogTail(self.path, self.cookie, **kw) as tail:
+            return list(tail)
+
+    def test_literal(self):
+        self.assertEqual([b'haproxy: one\n', b'haproxy: three\n',
+                          b'haproxy: five\n'], self.read(prefilter=b'haproxy'))
+
+    def test_regex(self):
+        self.assertEqual([[b'sshd: two\n', b'cron: four\n']], self.read(
+            batch='lines', prefilter=re.compile(rb'^(sshd|cron):', re.M)))
+
+    def test_chunks(self):
+        chunks = self.read(batch='chunks', prefilter=b'two')
+        self.assertEqual([b'sshd: two\n'], [bytes(c) for c in chunks])
+
+    def test_match_at_line_start_and_end(self):
+        self.assertEqual([[b'haproxy: one\n', b'cron: four\n']], self.read(
+            batch='lines', prefilter=re.compile(rb'one|cron')))
+
+    def test_nothing_matches(self):
+        self.assertEqual([], self.read(prefilter=b'nginx'))
+        self.write(b'nginx: six\n')
+        self.assertEqual([b'nginx: six\n'], self.read(prefilter=b'nginx'))
+
+    def test_position_after_consumed_line(self):
+        with LogTail(self.path, self.cookie, prefilter=b'haproxy') as tail:
+            self.assertEqual(b'haproxy: one\n', next(tail))
+        self.assertEqual([b'haproxy: three\n', b'haproxy: five\n'],
+                         self.read(prefilter=b'haproxy'))
+
+    def test_max_bytes_counts_dropped_lines(self):
+        # 28 bytes delivered, but 38 bytes read
+        self.assertEqual([b'haproxy: one\n', b'haproxy: three\n'], self.read(
+            prefilter=b'haproxy', blocksize=24, max_bytes=30))
+
+    def test_max_bytes_when_whole_blocks_are_dropped(self):
+        self.write(b'sshd: noise\n' * 1000 + b'nginx: last\n')
+        logtail = LogTail(self.path, self.cookie, prefilter=b'nginx',
+                          blocksize=1000, max_bytes=5000)
+        with logtail as tail:
+            self.assertEqual([], list(tail))
+        self.assertTrue(logtail.truncated)
+        self.assertLess(logtail.pos, 6000)
+        self.assertEqual([b'nginx: last\n'], self.read(prefilter=b'nginx'))
+
+    def test_checkpoint_when_whole_blocks_are_dropped(self):
+        self.write(b'sshd: noise\n' * 1000 + b'nginx: last\n')
+        cookie = nagiosplugin.Cookie(self.statefile, atomic=True)
+        with self.assertRaises(nagiosplugin.Timeout):
+            with LogTail(self.path, cookie, prefilter=b'nginx',
+                         blocksize=1000, checkpoint_bytes=2000) as tail:
+                next(tail)
+                raise nagiosplugin.Timeout()
+        with nagiosplugin.Cookie(self.statefile) as cookie:
+            self.assertGreater(cookie[self.path]['pos'], 5000)
+
+    def test_reject_prefilter_matching_empty_string(self):
+        for prefilter in [b'', re.compile(rb'x*')]:
+            with self.assertRaises(ValueError):
+                LogTail(self.path, self.cookie, prefilter=prefilter)
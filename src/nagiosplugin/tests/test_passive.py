@@ -0,0 +1,152 @@
+from nagiosplugin.passive import format_command, format_check_output, \
+    CommandFile, SpoolDirectory, _chunks
+import nagiosplugin
+import os
+import select
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+
+class Users(nagiosplugin.Resource):
+
+    def probe(self):
+        return [nagiosplugin.Metric('users', 4, min=0)]
+
+
+def evaluated_check(verbose=0):
+    check = nagiosplugin.Check(
+        Users(), nagiosplugin.ScalarContext('users', '0:3'))
+    check.verbose = verbose
+    check()
+    return check
+
+
+class FormatTest(unittest.TestCase):
+
+    def test_format_command(self):
+        self.assertEqual(
+            '[1400000000] PROCESS_SERVICE_CHECK_RESULT;web01;users;1;'
+            'USERS WARNING | users=4\\nlong\\\\output\n',
+            format_command('web01', 'users', 1,
+                           'USERS WARNING | users=4\nlong\\output\n',
+                           1400000000.7))
+
+    def test_format_check_output(self):
+        self.assertEqual(
+            'USERS WARNING - users is 4 | users=4;3;;0',
+            format_check_output(evaluated_check()))
+
+    def test_format_check_output_verbose(self):
+        self.assertEqual(
+            'USERS WARNING - users is 4\n'
+            'warning: users is 4\n'
+            '| users=4;3;;0', format_check_output(evaluated_check(1)))
+
+    def test_chunks_split_at_line_boundaries(self):
+        data = b'aaa\nbbbbb\ncc\n'
+        self.assertEqual([b'aaa\n', b'bbbbb\n', b'cc\n'],
+                         list(_chunks(data, 7)))
+        self.assertEqual([data], list(_chunks(data, 100)))
+
+    def test_chunks_split_overlong_lines(self):
+        self.assertEqual([b'aaaa', b'aa\n'], list(_chunks(b'aaaaaa\n', 4)))
+
+
+class SinkTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix='np-passive-')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_command_file_fifo(self):
+        fifo = os.path.join(self.dir, 'nagios.cmd')
+        os.mkfifo(fifo)
+        received = []
+
+        def read():
+            with open(fifo, 'rb') as f:
+                received.append(f.read())
+
+        reader = threading.Thread(target=read)
+        reader.start()
+        fd = os.open(fifo, os.O_WRONLY)  # wait until reader is ready
+        with CommandFile(fifo, 'web01') as sink:
+            for i in range(200):
+                sink.add('svc{0}'.format(i), 0, 'OK - {0}'.format(i), None,
+                         1400000000)
+            sink.add_check(evaluated_check(), timestamp=1400000000)
+        os.close(fd)
+        reader.join(5)
+        lines = received[0].decode().splitlines()
+        self.assertEqual(201, len(lines))
+        self.assertEqual('[1400000000] PROCESS_SERVICE_CHECK_RESULT;web01;'
+                         'svc0;0;OK - 0', lines[0])
+        self.assertEqual('[1400000000] PROCESS_SERVICE_CHECK_RESULT;web01;'
+                         'Users;1;USERS WARNING - users is 4 | users=4;3;;0',
+                         lines[-1])
+
+    def test_command_file_splits_only_overlong_commands(self):
+        path = os.path.join(self.dir, 'commands')
+        open(path, 'w').close()
+        writes = []
+        write = os.write
+
+        def record(fd, data):
+            writes.append(bytes(data))
+            return write(fd, data)
+
+        pipe_buf = select.PIPE_BUF
+        with CommandFile(path, 'web01') as sink:
+            sink.add('short1', 0, 'OK')
+            sink.add('long', 0, 'OK ' + 'x' * pipe_buf)
+            sink.add('short2', 0, 'OK')
+            with mock.patch('os.write', record):
+                sink.flush()
+        self.assertTrue(all(len(w) <= pipe_buf for w in writes))
+        self.assertEqual(3, len(writes))
+        self.assertTrue(writes[0].endswith(b'short1;0;OK\n'))
+        self.assertNotIn(b'\n', writes[1])
+        self.assertTrue(writes[2].endswith(b'short2;0;OK\n'))
+        with open(path, 'rb') as f:
+            self.assertEqual(b''.join(writes), f.read())
+
+    def test_command_file_without_reader_raises(self):
+        fifo = os.path.join(self.dir, 'nagios.cmd')
+        os.mkfifo(fifo)
+        sink = CommandFile(fifo, 'web01').add('svc', 0, 'OK')
+        with self.assertRaises(OSError):
+            sink.flush()
+
+    def test_flush_clears_buffer(self):
+        path = os.path.join(self.dir, 'commands')
+        open(path, 'w').close()
+        sink = CommandFile(path, 'web01')
+        sink.add('svc', 0, 'OK', timestamp=0)
+        sink.flush()
+        sink.flush()
+        with open(path) as f:
+            self.assertEqual(
+                '[0] PROCESS_SERVICE_CHECK_RESULT;web01;svc;0;OK\n', f.read())
+
+    def test_spool_directory(self):
+        with SpoolDirectory(self.dir, 'web01') as sink:
+            sink.add('a', 0, 'OK', timestamp=0)
+            sink.add('b', 2, 'CRITICAL', host='db01', timestamp=0)
+        files = os.listdir(self.dir)
+        self.assertEqual(1, len(files))
+        self.assertTrue(files[0].endswith('.cmd'))
+        self.assertFalse(files[0].startswith('.tmp'))
+        with open(os.path.join(self.dir, files[0])) as f:
+            self.assertEqual(
+                '[0] PROCESS_SERVICE_CHECK_RESULT;web01;a;0;OK\n'
+                '[0] PROCESS_SERVICE_CHECK_RESULT;db01;b;2;CRITICAL\n',
+                f.read())
+
+    def test_spool_directory_no_file_if_empty(self):
+        SpoolDirectory(self.dir, 'web01').flush()
+        self.assertEqual([], os.listdir(self.dir))
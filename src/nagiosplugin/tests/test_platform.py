@@ -1,5 +1,8 @@
-from nagiosplugin.platform import with_timeout
+from nagiosplugin.platform import with_timeout, with_thread_timeout, \
+    cancelled
 import nagiosplugin
+import signal
+import threading
 import time
 import unittest
 
@@ -9,3 +12,90 @@ class PlatformTest(unittest.TestCase):
     def test_timeout(self):
         with self.assertRaises(nagiosplugin.Timeout):
             with_timeout(1, time.sleep, 2)
+
+    def test_subsecond_timeout(self):
+        start = time.monotonic()
+        with self.assertRaises(nagiosplugin.Timeout) as cm:
+            with_timeout(0.2, time.sleep, 2)
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertRegex(str(cm.exception), r'^0\.2\d*s$')
+
+    def test_no_timeout_if_function_returns_in_time(self):
+        with_timeout(0.5, time.sleep, 0.01)
+        self.assertEqual((0.0, 0.0), signal.getitimer(signal.ITIMER_REAL))
+
+    def test_exception_passes_through(self):
+        with self.assertRaises(ZeroDivisionError):
+            with_timeout(1, lambda: 1 / 0)
+
+    def test_outer_timer_is_preserved(self):
+        signal.setitimer(signal.ITIMER_REAL, 5)
+        try:
+            with_timeout(0.5, time.sleep, 0.01)
+            remaining = signal.getitimer(signal.ITIMER_REAL)[0]
+            self.assertTrue(4 < remaining < 5, remaining)
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+    def test_outer_timeout_fires_first(self):
+        with self.assertRaises(nagiosplugin.Timeout) as cm:
+            with_timeout(0.2, with_timeout, 5, time.sleep, 2)
+        self.assertRegex(str(cm.exception), r'^0\.2\d*s$')
+
+    def test_nested_inner_timeout_fires_first(self):
+        outer_handler = []
+
+        def inner():
+            with self.assertRaises(nagiosplugin.Timeout):
+                with_timeout(0.1, time.sleep, 2)
+            outer_handler.append(signal.getsignal(signal.SIGALRM))
+            time.sleep(2)
+
+        with self.assertRaises(nagiosplugin.Timeout) as cm:
+            with_timeout(0.5, inner)
+        self.assertRegex(str(cm.exception), r'^0\.5\d*s$')
+        self.assertTrue(callable(outer_handler[0]))
+
+    def test_timeout_in_thread(self):
+        exc = []
+
+        def target():
+            try:
+                with_timeout(0.2, time.sleep, 1)
+            except nagiosplugin.Timeout as e:
+                exc.append(e)
+
+        t = threading.Thread(target=target)
+        t.start()
+        t.join()
+        self.assertEqual(1, len(exc))
+
+
+class ThreadTimeoutTest(unittest.TestCase):
+
+    def test_timeout(self):
+        with self.assertRaises(nagiosplugin.Timeout):
+            with_thread_timeout(0.1, time.sleep, 1)
+
+    def test_return_in_time(self):
+        with_thread_timeout(1, time.sleep, 0)
+
+    def test_exception_passes_through(self):
+        with self.assertRaises(ZeroDivisionError):
+            with_thread_timeout(1, lambda: 1 / 0)
+
+    def test_abandoned_function_gets_cancelled(self):
+        states = []
+        done = threading.Event()
+
+        def work():
+            states.append(cancelled())
+            time.sleep(0.3)
+            states.append(cancelled())
+            done.set()
+
+        with self.assertRaises(nagiosplugin.Timeout):
+            with_thread_timeout(0.1, work)
+        self.assertFalse(cancelled())
+        done.wait(2)
+        self.assertEqual([False, True], states)
@@ -2,6 +2,8 @@ from nagiosplugin.runtime import Runtime, guarded
 import logging
 import nagiosplugin
 import pytest
+import threading
+import time
 
 
 @pytest.fixture
@@ -25,17 +27,75 @@ def fake_check():
 
 @pytest.fixture
 def runtime_instance(fake_check):
-    Runtime.instance = None
+    nagiosplugin.runtime._current.set(None)
     r = Runtime()
     r.check = fake_check
     r.sysexit = lambda e: None
     return r
 
 
-def test_runtime_is_singleton(runtime_instance):
+def test_runtime_is_bound_to_context(runtime_instance):
     assert Runtime() is runtime_instance
 
 
+def test_threads_get_separate_runtimes(runtime_instance):
+    runtimes = []
+    t = threading.Thread(target=lambda: runtimes.append(Runtime()))
+    t.start()
+    t.join()
+    assert runtimes[0] is not runtime_instance
+
+
+def test_busy_runtime_is_not_shared(runtime_instance):
+    runtime_instance.executing = True
+    assert Runtime() is not runtime_instance
+
+
+def test_successive_executions_do_not_accumulate(runtime_instance,
+                                                 fake_check):
+
+    def log_once():
+        logging.getLogger('nagiosplugin').warning('logged once')
+
+    fake_check.__class__.__call__ = lambda self: log_once()
+    for _ in range(2):
+        output, _ = runtime_instance.execute(fake_check)
+        assert 1 == output.count('logged once')
+
+
+def test_parallel_executions_are_isolated():
+    import nagiosplugin.check
+
+    class Chatty(nagiosplugin.Resource):
+        def __init__(self, tag):
+            self.tag = tag
+
+        def probe(self):
+            for i in range(20):
+                logging.getLogger('nagiosplugin').warning(self.tag)
+                time.sleep(0.001)
+            return nagiosplugin.Metric(self.tag, 1, context='default')
+
+    outputs = {}
+
+    def run(tag):
+        check = nagiosplugin.check.Check(Chatty(tag))
+        outputs[tag] = check.run(verbose=1, timeout=0)[0]
+
+    threads = [threading.Thread(target=run, args=(tag,))
+               for tag in ('alpha', 'beta', 'gamma')]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert 3 == len(outputs)
+    for tag, output in outputs.items():
+        assert output.startswith('CHATTY OK - {0} is 1'.format(tag))
+        assert 20 == output.splitlines().count(tag)
+        for other in set(outputs) - {tag}:
+            assert other not in output
+
+
 def test_run_sets_exitcode(runtime_instance):
     runtime_instance.run()
     assert 0 == runtime_instance.exitcode
@@ -0,0 +1,143 @@
+from nagiosplugin.server import CheckServer, call, invoke, resolve
+import logging
+import nagiosplugin
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+
+class Pid(nagiosplugin.Resource):
+
+    def probe(self):
+        logging.getLogger('nagiosplugin').info('probing pid')
+        return nagiosplugin.Metric('pid', os.getpid(), context='null')
+
+
+class Sleep(nagiosplugin.Resource):
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def probe(self):
+        time.sleep(self.seconds)
+        return nagiosplugin.Metric('slept', self.seconds, context='default')
+
+
+@nagiosplugin.guarded
+def check_pid():
+    nagiosplugin.Check(Pid()).main(verbose=3)
+
+
+@nagiosplugin.guarded
+def check_sleep():
+    nagiosplugin.Check(Sleep(float(sys.argv[1]))).main(0, 1)
+
+
+def check_exit_only():
+    sys.exit()
+
+
+class InvokeTest(unittest.TestCase):
+
+    def test_resolve(self):
+        self.assertIs(os.path.join, resolve('os.path:join'))
+        self.assertIs(os.path.join, resolve('os:path.join'))
+
+    def test_invoke_captures_output_and_exitcode(self):
+        output, exitcode = invoke(check_pid, ['check_pid'])
+        self.assertTrue(output.startswith('PID OK - {0}\n'.format(
+            os.getpid())))
+        self.assertEqual(0, exitcode)
+
+    def test_invoke_exit_without_code(self):
+        self.assertEqual(('', 0), invoke(check_exit_only, ['x']))
+
+    def test_invoke_restores_argv(self):
+        argv = sys.argv
+        invoke(check_exit_only, ['x', 'y'])
+        self.assertIs(argv, sys.argv)
+
+
+class CheckServerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix='np-server-')
+        self.path = os.path.join(self.dir, 'sock')
+        self.server = CheckServer(self.path, {
+            'pid': check_pid,
+            'sleep': check_sleep,
+            'exit': 'nagiosplugin.tests.test_server:check_exit_only',
+        }, request_timeout=3)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        shutil.rmtree(self.dir)
+
+    def test_call_returns_output_and_exitcode(self):
+        output, exitcode = call(self.path, 'exit')
+        self.assertEqual(('', 0), (output, exitcode))
+
+    def test_requests_run_in_separate_processes(self):
+        pids = set()
+        for _ in range(2):
+            output, exitcode = call(self.path, 'pid')
+            self.assertEqual(0, exitcode)
+            pids.add(int(output.split()[3]))
+        self.assertEqual(2, len(pids))
+        self.assertNotIn(os.getpid(), pids)
+
+    def test_log_output_does_not_bleed_between_requests(self):
+        for _ in range(2):
+            output, _ = call(self.path, 'pid')
+            self.assertEqual(1, output.count('probing pid'))
+
+    def test_concurrent_requests_with_timeout(self):
+        results = {}
+
+        def request(seconds):
+            results[seconds] = call(self.path, 'sleep', [str(seconds)])
+
+        threads = [threading.Thread(target=request, args=(s,))
+                   for s in (0, 2)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(('SLEEP OK - slept is 0 | slept=0.0\n', 0),
+                         results[0])
+        self.assertRegex(results[2][0], r'^SLEEP UNKNOWN: Timeout: check '
+                         r'execution aborted after 1(\.\d+)?s\n')
+        self.assertEqual(3, results[2][1])
+
+    def test_unknown_check(self):
+        self.assertEqual(('UNKNOWN: unknown check foo\n', 3),
+                         call(self.path, 'foo'))
+
+    def test_client_does_not_import_package(self):
+        proc = subprocess.run(
+            [sys.executable, '-c', 'import nagiosplugin_client, sys; '
+             'print(sorted(m for m in sys.modules '
+             'if m.startswith("nagiosplugin")))'],
+            stdout=subprocess.PIPE, env={'PYTHONPATH': ':'.join(sys.path)})
+        self.assertEqual("['nagiosplugin_client']\n", proc.stdout.decode())
+
+    def test_client_command_line(self):
+        proc = subprocess.run(
+            [sys.executable, '-m', 'nagiosplugin_client', self.path, 'exit'],
+            stdout=subprocess.PIPE, env={'PYTHONPATH': ':'.join(sys.path)})
+        self.assertEqual(b'', proc.stdout)
+        self.assertEqual(0, proc.returncode)
+
+    def test_server_not_reachable(self):
+        output, exitcode = call(os.path.join(self.dir, 'nosock'), 'pid')
+        self.assertTrue(output.startswith('UNKNOWN: cannot contact'))
+        self.assertEqual(3, exitcode)
@@ -0,0 +1,31 @@
+"""Fixtures shared by several test modules."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class TempDirTestCase(unittest.TestCase):
+    """Gives each test a fresh temporary directory :attr:`dir`."""
+
+    prefix = 'nagiosplugin.'
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix=self.prefix)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, data, name, mode=None):
+        """Appends `data` to file `name` in the temporary directory.
+
+        :param mode: file mode (default: append bytes or text depending
+            on the type of `data`)
+        :returns: path of the file
+        """
+        path = os.path.join(self.dir, name)
+        with open(path, mode or ('ab' if isinstance(data, bytes) else 'a')) \
+                as f:
+            f.write(data)
+        return path
@@ -0,0 +1,59 @@
+"""Thin client for :class:`nagiosplugin.server.CheckServer`.
+
+This module lives outside the nagiosplugin package on purpose: importing
+any module of the package runs the package's ``__init__``, which pulls in
+the whole library. The client only needs :mod:`socket` and :mod:`json`,
+so that invoking a check through a warm server costs little more than
+starting the interpreter.
+
+Invoke a check from the command line::
+
+    python -m nagiosplugin_client /run/nagiosplugin.sock load -w 1
+"""
+
+import json
+import socket
+import sys
+
+
+def call(path, check, argv=(), timeout=None):
+    """Requests execution of `check` from a :class:`CheckServer`.
+
+    :param path: the server's socket file name
+    :param check: name of the check as registered with the server
+    :param argv: command line arguments (without program name)
+    :param timeout: give up waiting for the server after so many seconds
+    :return: (output, exitcode) tuple
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(timeout)
+        sock.connect(path)
+        sock.sendall(json.dumps(dict(check=check, argv=list(argv))).encode(
+            'utf-8') + b'\n')
+        with sock.makefile('rb') as response:
+            reply = json.loads(response.readline().decode('utf-8'))
+    except socket.timeout:
+        return 'UNKNOWN: no response from server after {0}s\n'.format(
+            timeout), 3
+    except (OSError, ValueError) as e:
+        return 'UNKNOWN: cannot contact check server: {0}\n'.format(e), 3
+    finally:
+        sock.close()
+    return reply['output'], reply['exitcode']
+
+
+def main(argv=None):  # pragma: no cover
+    """Command line interface: print the check's output and exit."""
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) < 2:
+        print('usage: python -m nagiosplugin_client SOCKET NAME [ARG...]',
+              file=sys.stderr)
+        sys.exit(3)
+    output, exitcode = call(argv[0], argv[1], argv[2:])
+    print(output, end='')
+    sys.exit(exitcode)
+
+
+if __name__ == '__main__':  # pragma: no cover
+    main()